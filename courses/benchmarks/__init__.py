@@ -0,0 +1,11 @@
+"""
+Benchmarks of the recommender system on synthetic data.
+
+Run from the directory of manage.py:
+
+    python -m benchmarks --interactions 10000 --output bench.json
+    python -m benchmarks --interactions 100000 --compare bench.json
+
+Data is generated in a throwaway test database, Whoosh index and shelve, with a fixed seed,
+so reports of different commits at the same scale and seed can be compared directly.
+"""
@@ -0,0 +1,56 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import django
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmark the recommender system on synthetic data.")
+    parser.add_argument('--interactions', type=int, default=10000, help="UserCourse rows to generate (1k to 1M).")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic data and user sample.")
+    parser.add_argument('--samples', type=int, default=50, help="Users sampled for the per-user benchmarks.")
+    parser.add_argument('--repeats', type=int, default=3, help="Runs of each whole-data benchmark.")
+    parser.add_argument('--only', nargs='+', help="Benchmarks to run (default: all).")
+    parser.add_argument('--output', help="Write the JSON report to this file (default: stdout).")
+    parser.add_argument('--compare', help="Report of a previous run to compare the latencies with.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'courses.settings')
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import override_settings
+    from .suite import run_suite, write_report, compare
+
+    # Everything the benchmark writes goes to a test database and a temporary directory
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with tempfile.TemporaryDirectory() as tmp, override_settings(
+            WHOOSH_INDEX_DIR=os.path.join(tmp, 'whoosh_index'),
+            RECOMMENDER_SHELVE_FILE=os.path.join(tmp, 'precomputed'),
+        ):
+            report = run_suite(args.interactions, seed=args.seed, samples=args.samples, repeats=args.repeats, only=args.only)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    if args.output:
+        write_report(report, args.output)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print("\n".join(compare(report, baseline)), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import numpy as np
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from main.models import Platform, Category, Instructor, Course, UserCourse
+from main.populateDB import init_whoosh, index_courses
+
+PLATFORMS = ["Coursera", "edX", "OpenLearn"]
+LEVELS = ["Beginner", "Intermediate", "Advanced"]
+
+# Interactions per user on average; the number of courses grows more slowly than the interactions
+INTERACTIONS_PER_USER = 20
+MIN_COURSES = 50
+MAX_COURSES = 20000
+
+
+def scale_sizes(interactions):
+    """Users and courses generated for a given number of interactions."""
+    n_users = max(10, interactions // INTERACTIONS_PER_USER)
+    n_courses = int(min(MAX_COURSES, max(MIN_COURSES, interactions // 50)))
+    return n_users, n_courses
+
+
+def zipf_weights(n, exponent=1.1):
+    """Popularity weights of n items following a Zipf law, as probabilities."""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def generate_catalog(n_courses, rng):
+    """Platforms, categories, instructors and courses; returns the synthetic Whoosh documents of the courses."""
+    platforms = [Platform.objects.create(name=name) for name in PLATFORMS]
+    categories = [Category.objects.create(name=f"Category {i}") for i in range(max(5, n_courses // 200))]
+    instructors = [Instructor.objects.create(name=f"Instructor {i}") for i in range(max(10, n_courses // 20))]
+
+    now = timezone.now()
+    courses, docs = [], []
+    vocabulary = [f"topic{i}" for i in range(max(100, n_courses // 10))]
+    keyword_p = zipf_weights(len(vocabulary))
+
+    for i in range(n_courses):
+        platform = platforms[rng.integers(len(platforms))]
+        category = categories[rng.integers(len(categories))]
+        instructor = instructors[rng.integers(len(instructors))] if rng.random() < 0.8 else None
+        level = LEVELS[rng.integers(len(LEVELS))]
+        duration = int(rng.integers(1, 60))
+        rating = round(float(rng.uniform(2.5, 5.0)), 1) if rng.random() < 0.9 else None
+        keywords = [vocabulary[k] for k in rng.choice(len(vocabulary), size=5, replace=False, p=keyword_p)]
+        url = f"https://example.com/course/{i}"
+
+        courses.append(Course(
+            title=f"Course {i} {' '.join(keywords[:2])}", description=" ".join(keywords), platform=platform,
+            level=level, duration=duration, instructor=instructor, rating=rating, url=url,
+            category=category, last_scraped=now,
+        ))
+        docs.append({
+            "url": url, "title": courses[-1].title, "description": courses[-1].description,
+            "platform": platform.name, "level": level, "category": category.name,
+            "instructor": instructor.name if instructor else "", "duration": duration,
+            "rating": rating, "last_scraped": now, "keywords": keywords,
+        })
+
+    Course.objects.bulk_create(courses, batch_size=1000)
+    return docs
+
+
+def generate_interactions(n_users, n_interactions, rng):
+    """Users and UserCourse rows, with course popularity following a Zipf law."""
+    User.objects.bulk_create(
+        [User(username=f"bench{i}", password="!") for i in range(n_users)], batch_size=1000,
+    )
+    user_ids = list(User.objects.filter(username__startswith="bench").order_by('id').values_list('id', flat=True))
+    course_ids = np.array(Course.objects.order_by('id').values_list('id', flat=True))
+    popularity = zipf_weights(len(course_ids), exponent=0.8)
+
+    # Interactions per user drawn around the mean, then scaled to the requested total
+    per_user = rng.poisson(n_interactions / n_users, size=n_users).clip(1, len(course_ids))
+    per_user = np.maximum(1, np.round(per_user * n_interactions / per_user.sum())).astype(int).clip(1, len(course_ids))
+
+    rows = []
+    for user_id, count in zip(user_ids, per_user):
+        for course_id in rng.choice(course_ids, size=count, replace=False, p=popularity):
+            feedback = rng.random()
+            rows.append(UserCourse(
+                user_id=user_id, course_id=int(course_id),
+                liked=feedback < 0.3, disliked=0.3 <= feedback < 0.4,
+                viewed=int(rng.poisson(1.5)),
+            ))
+        if len(rows) >= 10000:
+            UserCourse.objects.bulk_create(rows, batch_size=1000)
+            rows = []
+    UserCourse.objects.bulk_create(rows, batch_size=1000)
+
+
+def generate(interactions, seed=0):
+    """Fill the current database and Whoosh index with a synthetic catalog and interactions. Returns the sizes."""
+    rng = np.random.default_rng(seed)
+    n_users, n_courses = scale_sizes(interactions)
+
+    docs = generate_catalog(n_courses, rng)
+    index_courses(docs, init_whoosh())
+    generate_interactions(n_users, interactions, rng)
+
+    return {
+        'users': n_users,
+        'courses': n_courses,
+        'interactions': UserCourse.objects.count(),
+    }
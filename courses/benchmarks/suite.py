@@ -0,0 +1,247 @@
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import django
+import numpy as np
+from django.contrib.auth.models import User
+from django.test.utils import override_settings
+
+from main.autocomplete import AUTOCOMPLETE, build_prefix_indexes
+from main.models import Course
+from main.populateDB import init_whoosh, index_courses
+from main.recommender import recommend_hybrid
+from main.recommender_colab import build_prefs, calculateSimilarItems, recommend_collaborative
+from main.recommender_content import build_user_profile, recommend_content_courses, stored_keywords
+from main.recommender_utils import precalculate_data, update_item_similarities, MAX_RATERS_PER_COURSE
+from main.search import SEARCHERS
+from main.search_backends import BACKENDS, search_backend, FieldTerm, FieldRange
+from main.views import similar_courses_given_course
+
+from .data import generate
+from .timing import percentiles, measure, peak_memory
+
+# Autocomplete requests timed per sampled user: enough calls for a meaningful p99
+PREFIXES_PER_SAMPLE = 20
+
+# Searches timed per sampled user and search backend
+SEARCHES_PER_SAMPLE = 20
+
+# Above these many interactions calculateSimilarItems (quadratic in courses) takes too long to sample
+SIMILAR_ITEMS_MAX_INTERACTIONS = 100000
+
+
+def quiet_precalculate_data():
+    with contextlib.redirect_stdout(io.StringIO()):
+        precalculate_data(workers=1)
+
+
+def build_autocomplete(prefs):
+    with SEARCHERS.searcher() as searcher:
+        build_prefix_indexes(searcher)
+
+
+def sample_prefixes(rng, size):
+    """What users type: the first 1 to 6 letters of a word of random course titles."""
+    titles = list(Course.objects.values_list('title', flat=True))
+    prefixes = []
+    for i in rng.integers(len(titles), size=size):
+        words = titles[i].split()
+        word = words[rng.integers(len(words))]
+        prefixes.append(word[:rng.integers(1, 7)])
+    return prefixes
+
+
+def catalog_documents():
+    """The courses of the database as given to index_courses, with the keywords of the Whoosh index."""
+    keywords = stored_keywords()
+    return [
+        {
+            "url": c.url, "title": c.title, "description": c.description, "platform": c.platform.name,
+            "level": c.level, "category": c.category.name if c.category else "",
+            "instructor": c.instructor.name if c.instructor else "", "duration": c.duration, "rating": c.rating,
+            "last_scraped": c.last_scraped, "keywords": keywords.get(c.url, []),
+        }
+        for c in Course.objects.select_related('platform', 'category', 'instructor')
+    ]
+
+
+def index_whoosh_from_scratch(docs):
+    with tempfile.TemporaryDirectory() as tmp:
+        index_courses(docs, init_whoosh(os.path.join(tmp, 'whoosh_index')))
+
+
+def index_fts5_from_scratch(docs):
+    backend = search_backend('sqlite_fts5')
+    backend.clear()
+    backend.index_courses(docs)
+
+
+# Indexing of the whole catalog into an empty index of each search backend
+BACKEND_INDEXING = {
+    'whoosh': index_whoosh_from_scratch,
+    'sqlite_fts5': index_fts5_from_scratch,
+}
+
+
+def sample_search_texts(docs, rng, size):
+    """One or two words of the titles and keywords of random courses."""
+    texts = []
+    for i in rng.integers(len(docs), size=size):
+        words = docs[i]["title"].split() + docs[i]["keywords"]
+        texts.append(" ".join(rng.choice(words, size=min(2, len(words)), replace=False)))
+    return texts
+
+
+def benchmark_search_backends(rng, samples, repeats):
+    """Indexing throughput and query latencies of every search backend over the same catalog."""
+    results = {}
+    docs = catalog_documents()
+    texts = sample_search_texts(docs, rng, samples * SEARCHES_PER_SAMPLE)
+    platform_name = docs[0]["platform"]
+    filters = [FieldTerm('platform', platform_name), FieldRange('rating', 4.0, None)]
+    course_ids = sorted(Course.objects.values_list('id', flat=True))
+    sample_ids = rng.choice(course_ids, size=min(samples, len(course_ids)), replace=False).tolist()
+    courses = list(Course.objects.select_related('platform', 'category', 'instructor').filter(id__in=sample_ids).order_by('id'))
+
+    for name in BACKENDS:
+        backend = search_backend(name)
+        print(f"{name}_index...", file=sys.stderr)
+        indexing = run_benchmark(BACKEND_INDEXING[name], [(docs,)] * repeats)
+        indexing['docs_per_second'] = len(docs) / indexing['p50']
+        results[f'{name}_index'] = indexing
+
+        print(f"{name}_search...", file=sys.stderr)
+        results[f'{name}_search'] = run_benchmark(lambda text: backend.search(text, limit=10), [(t,) for t in texts])
+        results[f'{name}_search_filtered'] = run_benchmark(
+            lambda text: backend.search(text, filters, limit=10), [(t,) for t in texts],
+        )
+        with override_settings(SEARCH_BACKEND=name):
+            results[f'{name}_similar_courses'] = run_benchmark(similar_courses_given_course, [(c,) for c in courses])
+    return results
+
+
+# (name, function, takes a user or the whole preference dict)
+BATCH_BENCHMARKS = [
+    ('build_prefs', lambda prefs: build_prefs()),
+    ('calculateSimilarItems', calculateSimilarItems),
+    ('precalculate_data', lambda prefs: quiet_precalculate_data()),
+    ('autocomplete_build', build_autocomplete),
+]
+
+USER_BENCHMARKS = [
+    ('build_user_profile', build_user_profile),
+    ('recommend_content_courses', lambda user: recommend_content_courses(user, limit=10)),
+    ('recommend_collaborative', lambda user: recommend_collaborative(user, limit=10)),
+    ('recommend_hybrid', lambda user: recommend_hybrid(user, limit=10)),
+    ('update_item_similarities', lambda user: update_item_similarities({user.id}, (), max_raters=MAX_RATERS_PER_COURSE)),
+]
+
+
+def git_revision():
+    """Commit the benchmarked code was at, and whether the tree had local changes."""
+    cwd = Path(__file__).resolve().parent
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=cwd, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=cwd, capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def run_benchmark(func, args_list):
+    result = percentiles(measure(func, args_list))
+    result['peak_memory_bytes'] = peak_memory(func, args_list[0])
+    return result
+
+
+def run_suite(interactions, seed=0, samples=50, repeats=3, only=None):
+    """Generate the synthetic data set in the current database and time every benchmark. Returns the report."""
+    commit, dirty = git_revision()
+    report = {
+        'meta': {
+            'commit': commit,
+            'dirty': dirty,
+            'timestamp': time.time(),
+            'python': sys.version.split()[0],
+            'django': django.get_version(),
+            'platform': platform.platform(),
+            'seed': seed,
+            'interactions': interactions,
+            'samples': samples,
+            'repeats': repeats,
+        },
+        'results': {},
+    }
+
+    start = time.perf_counter()
+    report['dataset'] = generate(interactions, seed=seed)
+    report['dataset']['generation_seconds'] = time.perf_counter() - start
+
+    selected = lambda name: only is None or name in only
+    prefs = build_prefs()
+
+    for name, func in BATCH_BENCHMARKS:
+        if not selected(name):
+            continue
+        if name == 'calculateSimilarItems' and interactions > SIMILAR_ITEMS_MAX_INTERACTIONS:
+            report['results'][name] = {'skipped': f"more than {SIMILAR_ITEMS_MAX_INTERACTIONS} interactions"}
+            continue
+        print(f"{name}...", file=sys.stderr)
+        report['results'][name] = run_benchmark(func, [(prefs,)] * repeats)
+
+    # The per-user recommenders need the precomputed data
+    if not selected('precalculate_data'):
+        quiet_precalculate_data()
+
+    rng = np.random.default_rng(seed)
+    user_ids = sorted(prefs)
+    sample_ids = rng.choice(user_ids, size=min(samples, len(user_ids)), replace=False).tolist()
+    users = list(User.objects.filter(id__in=sample_ids).order_by('id'))
+
+    for name, func in USER_BENCHMARKS:
+        if not selected(name):
+            continue
+        print(f"{name}...", file=sys.stderr)
+        # Warm up: stored profiles and process-resident data are built on first use
+        for user in users:
+            func(user)
+        report['results'][name] = run_benchmark(func, [(user,) for user in users])
+
+    if selected('autocomplete'):
+        print("autocomplete...", file=sys.stderr)
+        prefixes = sample_prefixes(rng, samples * PREFIXES_PER_SAMPLE)
+        # The prefix index is built once per index commit, not per keystroke
+        AUTOCOMPLETE.indexes()
+        report['results']['autocomplete'] = run_benchmark(AUTOCOMPLETE.suggest, [(prefix,) for prefix in prefixes])
+
+    if selected('search_backends'):
+        report['results'].update(benchmark_search_backends(rng, samples, repeats))
+
+    return report
+
+
+def write_report(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+def compare(report, baseline):
+    """Lines comparing the p50/p95 latencies of a report with those of a baseline report."""
+    lines = [f"{'benchmark':<28}{'p50 base':>12}{'p50 new':>12}{'ratio':>8}{'p95 base':>12}{'p95 new':>12}"]
+    if baseline['meta'].get('interactions') != report['meta']['interactions'] or baseline['meta'].get('seed') != report['meta']['seed']:
+        lines.append("(¡Atención! los informes usan escalas o semillas distintas)")
+    for name, new in report['results'].items():
+        old = baseline['results'].get(name)
+        if not old or 'skipped' in old or 'skipped' in new:
+            continue
+        ratio = new['p50'] / old['p50'] if old['p50'] else float('inf')
+        lines.append(f"{name:<28}{old['p50']:>12.5f}{new['p50']:>12.5f}{ratio:>8.2f}{old['p95']:>12.5f}{new['p95']:>12.5f}")
+    return lines
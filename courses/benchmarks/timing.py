@@ -0,0 +1,38 @@
+import time
+import tracemalloc
+
+import numpy as np
+
+
+def percentiles(samples):
+    """Summary of latency samples in seconds."""
+    samples = np.asarray(samples, dtype=np.float64)
+    return {
+        'calls': len(samples),
+        'mean': float(samples.mean()),
+        'p50': float(np.percentile(samples, 50)),
+        'p95': float(np.percentile(samples, 95)),
+        'p99': float(np.percentile(samples, 99)),
+        'max': float(samples.max()),
+    }
+
+
+def measure(func, args_list):
+    """Call func once per argument tuple and return the latencies of every call."""
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def peak_memory(func, args):
+    """Peak memory allocated by Python during one call of func, in bytes (measured apart, tracing slows calls down)."""
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.instrumentation.QueryCountMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -128,4 +129,61 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Redirects after login/logout
 LOGIN_REDIRECT_URL = '/'
-LOGOUT_REDIRECT_URL = '/'
\ No newline at end of file
+LOGOUT_REDIRECT_URL = '/'
+
+# Recommender system
+
+# Processes used by precalculate_data (1 = compute inline, e.g. from the admin panel)
+RECOMMENDER_PRECOMPUTE_WORKERS = 1
+
+# Branches combined by the hybrid recommender (main.recommender.HYBRID_BRANCHES): 'content', 'collaborative'
+# (matrix factorization), 'item_based' (precomputed item similarities, updated after every feedback only while
+# this branch is selected) and 'user_based' (Pearson correlation with the users who rated the same courses).
+# The collaborative branches share the collaborative weight. The item similarities are only precomputed while
+# they are read, so run precalculate_data again after selecting 'item_based'.
+RECOMMENDER_HYBRID_BRANCHES = ('content', 'collaborative')
+
+# Seconds feedback is gathered before the item similarities it changed are recomputed in a background thread
+# (None = recompute them in the request), and raters of each course read to recompute them (the most recent)
+RECOMMENDER_ITEM_SIM_DELAY = 5.0
+RECOMMENDER_MAX_RATERS_PER_COURSE = 200
+
+# Seconds the content and collaborative recommenders may take, run concurrently, when the home page
+# computes recommendations live (None = run them one after the other without a deadline)
+RECOMMENDER_LATENCY_BUDGET = 1.0
+
+# Cached recommendation lists. Entries expire after TIMEOUT seconds and the least recently used ones are
+# evicted beyond MAX_ENTRIES. LocMemCache is per process; use FileBasedCache to share it between workers.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'recommendations': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'recommendations',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+
+# Full-text index used by the catalog search and similar courses: 'whoosh' or 'sqlite_fts5' (main.search_backends).
+# The Whoosh index is always built too: facets, autocomplete and the content recommender read it.
+# Migration 0008 creates an empty sqlite_fts5 table: fill it from the database and the Whoosh keywords with
+# `python manage.py index_search_backend --backend sqlite_fts5` (populate_database indexes it afterwards).
+SEARCH_BACKEND = 'whoosh'
+
+# Store the fields shown by all_courses in the Whoosh index, so search result pages are rendered from the
+# hits without loading the courses. Applies to indexes created afterwards (remove whoosh_index and populate).
+WHOOSH_STORED_RESULTS = False
+
+# Search rankings of all_courses kept per process (see main.search_cache)
+SEARCH_CACHE_SIZE = 500
+
+# Maximum (SQL queries, Whoosh searches) per request of each view, checked by main.tests and logged
+# by QueryCountMiddleware when exceeded. They must not grow with the number of courses shown.
+VIEW_QUERY_BUDGETS = {
+    'home': (20, 0),        # includes building the stored profile on a user's first visit
+    'all_courses': (8, 2),
+    'course_detail': (8, 4),
+    'course_autocomplete': (1, 0),  # the query rebuilds the prefix index after an index commit
+}
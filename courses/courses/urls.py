@@ -12,6 +12,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('', main_views.home, name='home'),
     path('courses/', main_views.all_courses, name='all_courses'),
+    path('courses/autocomplete/', main_views.course_autocomplete, name='course_autocomplete'),
     path('courses/<int:course_id>/', main_views.course_detail, name='course_detail'),
     path('populate/', main_views.populate_with_data, name='populate'),
     path('load-recommender-data/', main_views.load_recommender_data, name='load_recommender_data'),
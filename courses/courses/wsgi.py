@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'courses.settings')
 
 application = get_wsgi_application()
+
+# Build the search-as-you-type prefix index before serving the first keystroke
+from main.autocomplete import AUTOCOMPLETE
+AUTOCOMPLETE.warm_up()
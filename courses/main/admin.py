@@ -1,9 +1,10 @@
 from django.contrib import admin
 
 # Register your models here.
-from .models import Course, Platform, Category, Instructor, UserCourse
+from .models import Course, Platform, Category, Instructor, UserCourse, UserProfile
 admin.site.register(Course)
 admin.site.register(Platform)
 admin.site.register(Category)
 admin.site.register(Instructor)
-admin.site.register(UserCourse)
\ No newline at end of file
+admin.site.register(UserCourse)
+admin.site.register(UserProfile)
\ No newline at end of file
@@ -0,0 +1,127 @@
+import bisect
+import heapq
+import threading
+import unicodedata
+from collections import Counter
+
+from .models import Course
+from .populateDB import whoosh_index_dir
+from .recommender_content import parse_keywords
+from .search import SEARCHERS
+
+MAX_SUGGESTIONS = 20
+
+# Completions of prefixes up to this length match large ranges of keys, so they are remembered
+SHORT_PREFIX = 2
+
+
+def normalize(text):
+    """Lowercase text without accents and with single spaces, as compared by the prefix index."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(text.casefold().split())
+
+
+class PrefixIndex:
+    """
+    Sorted array of normalized texts, each one also keyed from every word after the first, so
+    "pyth" completes "Introduction to Python". The keys starting with a prefix form a contiguous
+    range found with two binary searches; the top suggestions are the heaviest of that range.
+    """
+
+    def __init__(self, entries):
+        # entries: [(text, weight, payload)]
+        self.entries = entries
+        keys = []
+        for i, (text, _, _) in enumerate(entries):
+            words = normalize(text).split()
+            keys.extend((' '.join(words[start:]), i) for start in range(len(words)))
+        keys.sort()
+        self.keys = [key for key, _ in keys]
+        self.ids = [i for _, i in keys]
+        self._short = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def complete(self, prefix, limit=8):
+        """Payloads of the limit heaviest entries with a word starting with prefix (already normalized)."""
+        if not prefix:
+            return []
+        if len(prefix) <= SHORT_PREFIX and (prefix, limit) in self._short:
+            return self._short[(prefix, limit)]
+
+        lo = bisect.bisect_left(self.keys, prefix)
+        hi = bisect.bisect_left(self.keys, prefix + '\U0010ffff', lo)
+        # A text matching from several of its words appears once
+        ids = set(self.ids[lo:hi])
+        best = heapq.nlargest(limit, ids, key=lambda i: (self.entries[i][1], -i))
+        result = [self.entries[i][2] for i in best]
+
+        if len(prefix) <= SHORT_PREFIX:
+            self._short[(prefix, limit)] = result
+        return result
+
+
+def build_prefix_indexes(searcher):
+    """
+    (courses, keywords) prefix indexes: course titles weighted by popularity and the keywords
+    stored in the Whoosh index weighted by the number of courses they describe.
+    """
+    course_entries = [
+        (title, score if score is not None else (rating or 0.0), {'id': course_id, 'title': title})
+        for course_id, title, score, rating in Course.objects.values_list('id', 'title', 'popularity__score', 'rating')
+        if title
+    ]
+
+    counts = Counter()
+    for fields in searcher.all_stored_fields():
+        counts.update(set(parse_keywords(fields.get('keywords'))))
+    keyword_entries = [(keyword, count, keyword) for keyword, count in counts.items()]
+
+    return PrefixIndex(course_entries), PrefixIndex(keyword_entries)
+
+
+class Autocompleter:
+    """
+    Process-wide prefix indexes of the catalog. They are built on first use (see warm_up) and
+    rebuilt when the Whoosh index has a new generation, i.e. after index_courses committed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built = None
+        self.builds = 0
+
+    def indexes(self):
+        """(courses, keywords) prefix indexes of the current generation of the index."""
+        with SEARCHERS.searcher() as searcher:
+            version = (whoosh_index_dir(), searcher.ixreader.generation())
+            built = self._built
+            if built is None or built[0] != version:
+                with self._lock:
+                    built = self._built
+                    if built is None or built[0] != version:
+                        built = self._built = (version, build_prefix_indexes(searcher))
+                        self.builds += 1
+            return built[1]
+
+    def suggest(self, text, limit=8):
+        """{'courses': [{'id', 'title'}], 'keywords': [keyword]} completing text, at most limit of each."""
+        limit = max(1, min(limit, MAX_SUGGESTIONS))
+        prefix = normalize(text)
+        courses, keywords = self.indexes()
+        return {
+            'courses': courses.complete(prefix, limit),
+            'keywords': keywords.complete(prefix, limit),
+        }
+
+    def warm_up(self):
+        """Build the prefix indexes now (at worker startup) instead of on the first keystroke."""
+        try:
+            self.indexes()
+        except Exception as e:
+            print(f"Autocomplete warm up error: {e}")
+
+
+AUTOCOMPLETE = Autocompleter()
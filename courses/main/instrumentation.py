@@ -0,0 +1,139 @@
+import contextvars
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager, ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.urls import resolve, Resolver404
+from whoosh.searching import Searcher
+
+logger = logging.getLogger(__name__)
+
+# Metrics of the request (or tracked block) running in the current thread
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """SQL queries and Whoosh searches issued while tracking was active."""
+
+    def __init__(self):
+        self.sql = 0
+        self.whoosh = 0
+        self.queries = []
+        self.elapsed = 0.0
+        # Queries may be counted from the threads of the recommender branches too (see in_current_context)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"<RequestMetrics sql={self.sql} whoosh={self.whoosh}>"
+
+
+def _count_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is not None:
+        with metrics._lock:
+            metrics.sql += 1
+            metrics.queries.append(sql)
+    return execute(sql, params, many, context)
+
+
+def install_whoosh_instrumentation():
+    """Wrap Searcher.search once so every search (search_page included) is counted in the current metrics."""
+    if getattr(Searcher.search, '_instrumented', False):
+        return
+    original = Searcher.search
+
+    @functools.wraps(original)
+    def search(self, *args, **kwargs):
+        metrics = _current.get()
+        if metrics is not None:
+            with metrics._lock:
+                metrics.whoosh += 1
+        return original(self, *args, **kwargs)
+
+    search._instrumented = True
+    Searcher.search = search
+
+
+@contextmanager
+def track():
+    """Count the SQL queries and Whoosh searches of a block: with track() as metrics: ..."""
+    install_whoosh_instrumentation()
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    start = time.perf_counter()
+    try:
+        with ExitStack() as stack:
+            _count_connections(stack)
+            yield metrics
+    finally:
+        metrics.elapsed = time.perf_counter() - start
+        _current.reset(token)
+
+
+def _count_connections(stack):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(_count_query))
+
+
+def _run_counted(func, args, kwargs):
+    with ExitStack() as stack:
+        if _current.get() is not None:
+            _count_connections(stack)
+        return func(*args, **kwargs)
+
+
+def in_current_context(func):
+    """
+    func bound to the context of the calling thread, to be run in another one: the queries and searches
+    it makes there are counted in the metrics of the caller. Connections are per thread, so theirs are wrapped too.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        return context.run(_run_counted, func, args, kwargs)
+
+    return run
+
+
+def view_budget(path):
+    """(max SQL queries, max Whoosh searches) configured in VIEW_QUERY_BUDGETS for the view serving path, or None."""
+    try:
+        name = resolve(path).url_name
+    except Resolver404:
+        return None
+    return getattr(settings, 'VIEW_QUERY_BUDGETS', {}).get(name)
+
+
+class QueryCountMiddleware:
+    """
+    Record the SQL queries and Whoosh searches of every request, report them in the
+    X-SQL-Queries and X-Whoosh-Searches headers and log the views that exceed their budget.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_whoosh_instrumentation()
+
+    def __call__(self, request):
+        with track() as metrics:
+            response = self.get_response(request)
+            # Lazy template responses query while rendering
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+
+        request.metrics = metrics
+        response['X-SQL-Queries'] = str(metrics.sql)
+        response['X-Whoosh-Searches'] = str(metrics.whoosh)
+
+        budget = view_budget(request.path_info)
+        if budget is not None and (metrics.sql > budget[0] or metrics.whoosh > budget[1]):
+            logger.warning(
+                "%s excede su presupuesto: %d consultas SQL (máx. %d), %d búsquedas Whoosh (máx. %d)",
+                request.path_info, metrics.sql, budget[0], metrics.whoosh, budget[1],
+            )
+        return response
@@ -0,0 +1,23 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from main.recommender_batch import generate_batch_recommendations, BATCH_LIMIT
+
+
+class Command(BaseCommand):
+    help = "Generate and store the hybrid recommendations of every user with interactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help="Number of worker processes (default: one per CPU).",
+        )
+        parser.add_argument(
+            '--limit', type=int, default=BATCH_LIMIT,
+            help="Recommendations stored per user.",
+        )
+
+    def handle(self, *args, **options):
+        run = generate_batch_recommendations(workers=options['workers'], limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(f"Recomendaciones de {run.users} usuarios guardadas ({run.finished_at:%d/%m/%Y %H:%M})."))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from main.search_backends import BACKENDS, catalog_courses, search_backend
+
+
+class Command(BaseCommand):
+    help = "Index the courses of the database in a search backend, e.g. to fill sqlite_fts5 after migrating."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backend', choices=sorted(BACKENDS), default=None,
+            help="Search backend to index (default: settings.SEARCH_BACKEND).",
+        )
+
+    def handle(self, *args, **options):
+        backend = search_backend(options['backend'])
+        courses = catalog_courses()
+        if backend.name != 'whoosh':
+            # Courses deleted from the database leave the index too; Whoosh holds the keywords and is updated
+            backend.clear()
+        backend.index_courses(courses)
+        self.stdout.write(self.style.SUCCESS(f"{len(courses)} cursos indexados en {backend.name}."))
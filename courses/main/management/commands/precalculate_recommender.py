@@ -0,0 +1,19 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from main.recommender_utils import precalculate_data
+
+
+class Command(BaseCommand):
+    help = "Precompute course features and collaborative data for the recommender system."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help="Number of worker processes (default: one per CPU).",
+        )
+
+    def handle(self, *args, **options):
+        precalculate_data(workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS("Datos del sistema de recomendación precalculados."))
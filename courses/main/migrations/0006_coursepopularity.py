@@ -0,0 +1,26 @@
+# Generated by Django 6.0.1 on 2026-10-18 01:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_userprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoursePopularity',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='main.course')),
+                ('rating', models.FloatField(blank=True, null=True)),
+                ('total_views', models.IntegerField(default=0)),
+                ('score', models.FloatField(default=0.0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-rating', '-total_views'], name='popularity_rank_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-18 01:53
+
+from django.db import migrations
+
+# Full-text table of the sqlite_fts5 search backend (main.search_backends.Fts5Backend)
+CREATE_COURSE_FTS = """
+CREATE VIRTUAL TABLE IF NOT EXISTS main_course_fts USING fts5(
+    url UNINDEXED, title, description, keywords, platform UNINDEXED, category UNINDEXED,
+    level UNINDEXED, instructor UNINDEXED, duration UNINDEXED, rating UNINDEXED,
+    tokenize='unicode61 remove_diacritics 2'
+)
+"""
+
+
+def create_course_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(CREATE_COURSE_FTS)
+
+
+def drop_course_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS main_course_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_recommendationrun_userrecommendation'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_course_fts, drop_course_fts),
+    ]
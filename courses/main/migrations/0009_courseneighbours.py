@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 09:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_course_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseNeighbours',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='neighbours', serialize=False, to='main.course')),
+                ('neighbours', models.JSONField(default=list)),
+                ('snapshot_version', models.FloatField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
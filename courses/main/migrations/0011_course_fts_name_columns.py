@@ -0,0 +1,37 @@
+# Generated by Django 6.0.1 on 2026-10-18 11:20
+
+from django.db import migrations
+
+# The names of platform, category, level and instructor become full-text columns, so similar courses
+# are found with MATCH (see Fts5Backend.match_any) instead of scanning the table
+COURSE_FTS = """
+CREATE VIRTUAL TABLE {table} USING fts5(
+    url UNINDEXED, title, description, keywords, platform{unindexed}, category{unindexed},
+    level{unindexed}, instructor{unindexed}, duration UNINDEXED, rating UNINDEXED,
+    tokenize='unicode61 remove_diacritics 2'
+)
+"""
+COLUMNS = "rowid, url, title, description, keywords, platform, category, level, instructor, duration, rating"
+
+
+def rebuild_course_fts(unindexed):
+    def rebuild(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        # FTS5 columns cannot be altered: the rows are copied to a new table
+        schema_editor.execute(COURSE_FTS.format(table='main_course_fts_new', unindexed=unindexed))
+        schema_editor.execute(f"INSERT INTO main_course_fts_new ({COLUMNS}) SELECT {COLUMNS} FROM main_course_fts")
+        schema_editor.execute("DROP TABLE main_course_fts")
+        schema_editor.execute("ALTER TABLE main_course_fts_new RENAME TO main_course_fts")
+    return rebuild
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_searchversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_course_fts(''), rebuild_course_fts(' UNINDEXED')),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 11:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_course_fts_name_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='recommendations_generation',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
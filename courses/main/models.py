@@ -64,3 +64,60 @@ class UserCourse(models.Model):
     class Meta:
         unique_together = ('user', 'course')
 
+
+class UserProfile(models.Model):
+    """Content-based profile of a user, maintained incrementally as their interactions change."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    vector = models.JSONField(default=dict)             # feature -> peso, con decaimiento hasta reference_time
+    weights = models.JSONField(default=dict)            # course_id -> peso de la interacción sin decaimiento
+    reference_time = models.DateTimeField()
+    snapshot_version = models.FloatField(null=True)     # versión de los datos precalculados usados
+    recommendations_generation = models.PositiveIntegerField(default=0)  # cambia con cada feedback del usuario
+
+
+class CoursePopularity(models.Model):
+    """Materialized popularity of a course, used to serve anonymous and cold-start recommendations."""
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='popularity')
+    rating = models.FloatField(null=True, blank=True)   # copia de Course.rating
+    total_views = models.IntegerField(default=0)        # suma de UserCourse.viewed
+    score = models.FloatField(default=0.0)              # rating + total_views / 100
+
+    class Meta:
+        indexes = [models.Index(fields=['-rating', '-total_views'], name='popularity_rank_idx')]
+
+
+class CourseNeighbours(models.Model):
+    """Neighbour list of a course recomputed after feedback, replacing its item_sim row of the same snapshot."""
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='neighbours')
+    neighbours = models.JSONField(default=list)         # [[similitud, course_id], ...] como en item_sim
+    snapshot_version = models.FloatField()              # versión de los datos precalculados que corrige
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class SearchVersion(models.Model):
+    """Counter of a piece of shared search state, compared by every worker to invalidate its search caches."""
+    name = models.CharField(max_length=50, primary_key=True)   # 'catalog' (save_courses_dB) o 'fts5' (índice FTS5)
+    value = models.BigIntegerField(default=0)
+
+
+class RecommendationRun(models.Model):
+    """One execution of the offline batch generation of recommendations."""
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    users = models.IntegerField(default=0)              # usuarios con recomendaciones generadas
+    snapshot_version = models.FloatField(null=True)     # versión de los datos precalculados usados
+
+    class Meta:
+        ordering = ["-started_at"]
+
+
+class UserRecommendation(models.Model):
+    """Precomputed hybrid recommendation of a course to a user, served by rank."""
+    run = models.ForeignKey(RecommendationRun, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    rank = models.IntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('user', 'rank')
@@ -1,14 +1,19 @@
 import os
 from whoosh import index
-from whoosh.fields import Schema, TEXT, ID, NUMERIC, KEYWORD, DATETIME
+from whoosh.fields import Schema, TEXT, ID, NUMERIC, KEYWORD, DATETIME, STORED
 from scrapping import coursera_scrapper, edx_scrapper, openLearn_scrapper
 from .models import Course, Platform, Category, Instructor
+from .search_cache import bump_catalog_version
+from django.conf import settings
 from django.utils import timezone
 from scrapping.utils import extract_keywords, compute_idf
 
 DB_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, "courses.db"))
 WHOOSH_INDEX_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, "whoosh_index"))
 
+# Characters of the description stored for result pages: all_courses shows it with truncatechars:220
+SUMMARY_LENGTH = 221
+
 # ------------------ DB (Django) ------------------
 
 def save_courses_dB(courses):
@@ -46,28 +51,46 @@ def save_courses_dB(courses):
             }
         )
 
+    # Cached search rankings may hold courses whose fields changed
+    bump_catalog_version()
+
 
 # ------------------ WHOOSH ------------------
 
-def init_whoosh(index_dir=WHOOSH_INDEX_DIR):
-    # Create index directory if it doesn't exist
-    if not os.path.exists(index_dir):
-        os.mkdir(index_dir)
-    
-    # Define schema
-    schema = Schema(
+def whoosh_index_dir():
+    """Index directory, resolved on every call so settings.WHOOSH_INDEX_DIR can point elsewhere (e.g. benchmarks)."""
+    return getattr(settings, 'WHOOSH_INDEX_DIR', WHOOSH_INDEX_DIR)
+
+def course_schema(stored_results=False):
+    """
+    Schema of the course index. With stored_results the fields shown in search result pages are stored
+    too (plus the course id and the start of the description), so pages can be rendered from the hits.
+    """
+    fields = dict(
         url=ID(stored=True, unique=True),
-        title=TEXT(stored=False),
+        title=TEXT(stored=stored_results),
         description=TEXT(stored=False),
         category=KEYWORD(stored=False, lowercase=True),
-        level = KEYWORD(lowercase=True, stored=False),
-        platform=KEYWORD(lowercase=True, stored=False),
-        instructor=KEYWORD(lowercase=True, stored=False),
-        duration=NUMERIC(stored=False, numtype=int, signed=False),
-        rating=NUMERIC(stored=False, numtype=float),
+        level = KEYWORD(lowercase=True, stored=stored_results),
+        platform=KEYWORD(lowercase=True, stored=stored_results),
+        instructor=KEYWORD(lowercase=True, stored=stored_results),
+        duration=NUMERIC(stored=stored_results, numtype=float),
+        rating=NUMERIC(stored=stored_results, numtype=float),
         last_scraped=DATETIME(stored=False),
         keywords=KEYWORD(commas=True, stored=True)
     )
+    if stored_results:
+        fields.update(course_id=NUMERIC(stored=True), summary=STORED)
+    return Schema(**fields)
+
+def init_whoosh(index_dir=None):
+    index_dir = index_dir or whoosh_index_dir()
+    # Create index directory if it doesn't exist
+    if not os.path.exists(index_dir):
+        os.mkdir(index_dir)
+    
+    # Define schema
+    schema = course_schema(getattr(settings, 'WHOOSH_STORED_RESULTS', False))
     # Create or open index
     if not index.exists_in(index_dir):
         ix = index.create_in(index_dir, schema)
@@ -75,7 +98,8 @@ def init_whoosh(index_dir=WHOOSH_INDEX_DIR):
         ix = index.open_dir(index_dir)
     return ix
 
-def open_whoosh(index_dir=WHOOSH_INDEX_DIR):
+def open_whoosh(index_dir=None):
+    index_dir = index_dir or whoosh_index_dir()
     if not os.path.exists(index_dir):
         os.mkdir(index_dir)
     if index.exists_in(index_dir):
@@ -85,9 +109,19 @@ def open_whoosh(index_dir=WHOOSH_INDEX_DIR):
 
 
 def index_courses(courses, ix):
+    stored_results = 'course_id' in ix.schema
+    if stored_results:
+        course_ids = dict(Course.objects.values_list('url', 'id'))
+
     writer = ix.writer()
 
     for course in courses:
+        extra = {}
+        if stored_results:
+            extra = dict(
+                course_id=course_ids.get(course["url"]),
+                summary=(course["description"] or "")[:SUMMARY_LENGTH],
+            )
         writer.update_document(
             url=course["url"],
             title=course["title"] or "",
@@ -99,7 +133,8 @@ def index_courses(courses, ix):
             duration=course["duration"] or None,
             rating=course["rating"] or None,
             last_scraped=course["last_scraped"],
-            keywords=",".join(course["keywords"] or [])
+            keywords=",".join(course["keywords"] or []),
+            **extra
         )
 
     writer.commit()
@@ -153,6 +188,13 @@ def run_scrapers(scrapers=None):
     index_courses(all_courses, open_ix)
     print("Courses indexed in Whoosh.")
 
+    # Imported here, search_backends imports this module
+    from .search_backends import search_backend
+    backend = search_backend()
+    if backend.name != 'whoosh':
+        backend.index_courses(all_courses)
+        print(f"Courses indexed in {backend.name}.")
+
     # Return scraped courses for the caller to save/index
     return all_courses
 
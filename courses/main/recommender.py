@@ -1,23 +1,66 @@
-from .models import Course, UserCourse
+from .models import Course, UserCourse, CoursePopularity
 from .recommender_content import recommend_content_courses
-from .recommender_colab import recommend_collaborative
+from .recommender_colab import recommend_collaborative, recommend_item_based, recommend_user_based
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, transaction
 from django.db.models import Sum
+from .instrumentation import in_current_context
+from .recommender_store import STORE
 
-def recommend_for_anonymous(limit=10):
-    """Recommend top-rated and most viewed courses for anonymous users."""
-    qs = (
+def popularity_score(rating, total_views):
+    """Simple combined score: rating (0-5) plus a scaled views component"""
+    return float(rating or 0) + float(total_views or 0) / 100.0
+
+
+def refresh_popularity():
+    """Rebuild the whole popularity table from the courses and their views, in one aggregate query."""
+    courses = Course.objects.annotate(total_views=Sum('usercourse__viewed')).values_list('id', 'rating', 'total_views')
+    rows = [
+        CoursePopularity(course_id=cid, rating=rating, total_views=views or 0, score=popularity_score(rating, views))
+        for cid, rating, views in courses
+    ]
+    with transaction.atomic():
+        CoursePopularity.objects.all().delete()
+        CoursePopularity.objects.bulk_create(rows, batch_size=1000)
+
+
+def update_course_popularity(course_id):
+    """Refresh the popularity row of a single course after its feedback changed."""
+    course = (
         Course.objects
+        .filter(id=course_id)
         .annotate(total_views=Sum('usercourse__viewed'))
-        .order_by('-rating', '-total_views')[:limit]
+        .values_list('rating', 'total_views')
+        .first()
     )
+    if course is None:
+        return
+    rating, views = course
+    CoursePopularity.objects.update_or_create(
+        course_id=course_id,
+        defaults={'rating': rating, 'total_views': views or 0, 'score': popularity_score(rating, views)},
+    )
+
+
+def popular_courses(limit=10, exclude_user=None):
+    """Most popular courses as recommendations, read from the popularity table in rank order."""
+    qs = CoursePopularity.objects.select_related('course__platform').order_by('-rating', '-total_views')
+    if exclude_user is not None:
+        qs = qs.exclude(course__in=UserCourse.objects.filter(user=exclude_user).values('course_id'))
+    return [{'course': p.course, 'score': p.score} for p in qs[:limit]]
 
-    recs = []
-    for c in qs:
-        rating_score = float(getattr(c, 'rating', 0) or 0)
-        views_score = float(getattr(c, 'total_views', 0) or 0)
-        # Simple combined score: rating (0-5) plus a scaled views component
-        score = rating_score + (views_score / 100.0)
-        recs.append({'course': c, 'score': score})
+
+def recommend_for_anonymous(limit=10, exclude_user=None):
+    """Recommend top-rated and most viewed courses for anonymous users (or courses new to exclude_user)."""
+    recs = popular_courses(limit, exclude_user)
+
+    # The table is filled by precalculate_data; build it on first use if it was never run
+    if not recs and not CoursePopularity.objects.exists() and Course.objects.exists():
+        refresh_popularity()
+        recs = popular_courses(limit, exclude_user)
 
     return recs
 
@@ -50,42 +93,120 @@ def hybrid_weights():
     else:
         return 0.4, 0.6
     
-def recommend_hybrid(user, limit=10):
+def recommend_hybrid(user, limit=10, budget=None):
     """Combine content-based and collaborative filtering recommendations."""
+    results, _ = recommend_hybrid_report(user, limit=limit, budget=budget)
+    return results
 
+
+def recommend_hybrid_report(user, limit=10, budget=None):
+    """
+    Hybrid recommendations together with the names of the branches that produced them.
+    Without a budget the content and collaborative branches run one after the other. With a budget
+    (in seconds) they run concurrently and the branches that miss the deadline are left out,
+    giving the weight of the hybrid to the ones that finished.
+    """
     interactions_count = UserCourse.objects.filter(user=user).count()
 
     # Cold start - we need more data from the user
     if interactions_count < 3:
-        results = recommend_for_anonymous(limit=limit + 3)
-        results = [r for r in results if r['course'].id not in 
-                   UserCourse.objects.filter(user=user).values_list('course_id', flat=True)]
-        return results[:limit]
+        return recommend_for_anonymous(limit=limit, exclude_user=user), ('popularity',)
 
-    content_recs = recommend_content_courses(user, limit=limit*2)
-    collab_recs = recommend_collaborative(user, limit=limit*2)
+    selected = hybrid_branches()
+    if budget is None:
+        branches = {name: func(user, limit=limit*2) for name, func in selected.items()}
+    else:
+        branches = run_branches_concurrently(selected, user, limit*2, budget)
 
-    # Normalizar
-    content_recs = normalize_scores([(r['course'], r['score']) for r in content_recs])
-    collab_recs = normalize_scores([(r['course'], r['score']) for r in collab_recs])
+    weights = {name: w for name, w in branch_weights(selected).items() if name in branches}
 
-
-    w_content, w_collab = hybrid_weights()
+    # Re-weight the branches that finished so their weights still add up to 1
+    total = sum(weights.values())
+    if not total:
+        return recommend_for_anonymous(limit=limit, exclude_user=user), ()
 
     scores = {}
 
-    for course, score in content_recs:
-        scores.setdefault(course.id, 0)
-        scores[course.id] += w_content * score
-
-    for course, score in collab_recs:
-        scores.setdefault(course.id, 0)
-        scores[course.id] += w_collab * score
+    for name, recs in branches.items():
+        # Normalizar
+        for course, score in normalize_scores([(r['course'], r['score']) for r in recs]):
+            scores.setdefault(course.id, 0)
+            scores[course.id] += weights[name] / total * score
 
     # Ordenar y obtener cursos
     ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-    courses = Course.objects.in_bulk([cid for cid, _ in ranked[:limit]])
+    courses = Course.objects.select_related('platform').in_bulk([cid for cid, _ in ranked[:limit]])
+
+    results = [{'course': courses[cid], 'score': score} for cid, score in ranked[:limit] if cid in courses]
+    return results, tuple(branches)
+
+
+HYBRID_BRANCHES = {
+    'content': recommend_content_courses,
+    'collaborative': recommend_collaborative,
+    'item_based': recommend_item_based,
+    'user_based': recommend_user_based,
+}
+
+# Branches combined when settings.RECOMMENDER_HYBRID_BRANCHES is not set
+DEFAULT_BRANCHES = ('content', 'collaborative')
+
+# Weight of hybrid_weights each branch gets a share of
+BRANCH_KINDS = {
+    'content': 'content',
+    'collaborative': 'collaborative',
+    'item_based': 'collaborative',
+    'user_based': 'collaborative',
+}
 
-    return [{'course': courses[cid], 'score': score} for cid, score in ranked[:limit] if cid in courses]
 
+def hybrid_branches():
+    """{name: recommender} of the branches selected by settings.RECOMMENDER_HYBRID_BRANCHES."""
+    names = getattr(settings, 'RECOMMENDER_HYBRID_BRANCHES', DEFAULT_BRANCHES)
+    unknown = set(names) - set(HYBRID_BRANCHES)
+    if unknown:
+        raise ImproperlyConfigured(f"Unknown recommender branches {sorted(unknown)}, use some of {sorted(HYBRID_BRANCHES)}")
+    return {name: HYBRID_BRANCHES[name] for name in names}
 
+
+def item_similarities_used(has_mf_model=None):
+    """
+    Whether item_sim is read by a selected branch, directly or as the fallback of a missing MF model.
+    has_mf_model tells whether there is one when it is not the model of the store (see precalculate_data).
+    """
+    branches = hybrid_branches()
+    if has_mf_model is None:
+        has_mf_model = STORE.get('mf_model') is not None
+    return 'item_based' in branches or ('collaborative' in branches and not has_mf_model)
+
+
+def branch_weights(names):
+    """Weight of each branch: the collaborative branches split the collaborative weight evenly."""
+    w_content, w_collab = hybrid_weights()
+    kind_weights = {'content': w_content, 'collaborative': w_collab}
+    counts = Counter(BRANCH_KINDS[name] for name in names)
+    return {name: kind_weights[BRANCH_KINDS[name]] / counts[BRANCH_KINDS[name]] for name in names}
+
+# Shared by every request; a branch that misses its deadline keeps its thread until it finishes,
+# but the ones still queued are cancelled so they do not delay later requests
+_branch_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='recommender')
+
+
+def run_branch(func, user, limit):
+    try:
+        return func(user, limit=limit)
+    finally:
+        # Pool threads outlive the request, so they must not keep database connections open
+        connections.close_all()
+
+
+def run_branches_concurrently(branches, user, limit, budget):
+    """Run the {name: recommender} branches in the thread pool and return {name: recommendations} of those done within budget seconds."""
+    futures = {
+        _branch_executor.submit(in_current_context(run_branch), func, user, limit): name
+        for name, func in branches.items()
+    }
+    done, not_done = wait(futures, timeout=budget)
+    for future in not_done:
+        future.cancel()
+    return {futures[f]: f.result() for f in futures if f in done and f.exception() is None}
@@ -0,0 +1,97 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import UserCourse, RecommendationRun, UserRecommendation
+from .recommender import recommend_hybrid
+from .recommender_store import STORE
+
+# Recommendations stored per user; home shows the first ones
+BATCH_LIMIT = 20
+
+# Users handled by each task sent to the process pool
+USERS_PER_TASK = 200
+
+
+def user_id_ranges(user_ids, size=USERS_PER_TASK):
+    """Consecutive (first_id, last_id) ranges covering the sorted user ids, with at most size users each."""
+    return [(user_ids[i], user_ids[min(i + size, len(user_ids)) - 1]) for i in range(0, len(user_ids), size)]
+
+
+def recommend_user_range(id_range, limit=BATCH_LIMIT):
+    """Hybrid recommendations of the users with interactions in an id range: [(user_id, [(course_id, score), ...]), ...]."""
+    first, last = id_range
+    users = User.objects.filter(id__range=(first, last), usercourse__isnull=False).distinct().order_by('id')
+    return [
+        (user.id, [(r['course'].id, r['score']) for r in recommend_hybrid(user, limit=limit)])
+        for user in users
+    ]
+
+
+def store_user_recommendations(run, results):
+    """Replace the stored recommendations of the given users with the run's results."""
+    user_ids = [user_id for user_id, _ in results]
+    rows = [
+        UserRecommendation(run=run, user_id=user_id, course_id=course_id, rank=rank, score=score)
+        for user_id, recs in results
+        for rank, (course_id, score) in enumerate(recs)
+    ]
+    with transaction.atomic():
+        UserRecommendation.objects.filter(user_id__in=user_ids).delete()
+        UserRecommendation.objects.bulk_create(rows, batch_size=1000)
+
+
+def generate_batch_recommendations(workers=None, limit=BATCH_LIMIT):
+    """
+    Run the hybrid recommender for every user with interactions and store the ranked results.
+    Users are split in id ranges processed by a process pool; each range is stored as soon as it finishes.
+    """
+    if workers is None:
+        workers = getattr(settings, 'RECOMMENDER_PRECOMPUTE_WORKERS', 1)
+
+    run = RecommendationRun.objects.create(snapshot_version=STORE.get('version'))
+    user_ids = list(UserCourse.objects.values_list('user_id', flat=True).distinct().order_by('user_id'))
+    ranges = user_id_ranges(user_ids)
+
+    executor = None
+    if workers > 1:
+        # Forked workers must not share this process' database connections
+        connections.close_all()
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=django.setup)
+
+    try:
+        parts = executor.map(recommend_user_range, ranges, repeat(limit)) if executor else map(recommend_user_range, ranges, repeat(limit))
+        for results in parts:
+            store_user_recommendations(run, results)
+            run.users += len(results)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    # Users who no longer have interactions keep no stale recommendations
+    UserRecommendation.objects.exclude(run=run).delete()
+
+    run.finished_at = timezone.now()
+    run.save(update_fields=['users', 'finished_at'])
+    print("Recomendaciones generadas para %d usuarios." % run.users)
+    return run
+
+
+def stored_recommendations(user, limit=10):
+    """
+    The user's recommendations from the last batch run, or an empty list if the user is not in it.
+    Courses the user interacted with since the run are left out, so feedback never discards the list.
+    """
+    recs = (
+        UserRecommendation.objects
+        .filter(user=user)
+        .exclude(course__in=UserCourse.objects.filter(user=user).values('course_id'))
+        .select_related('course__platform')
+        .order_by('rank')[:limit]
+    )
+    return [{'course': r.course, 'score': r.score} for r in recs]
@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+
+from .models import UserProfile
+from .recommender import recommend_hybrid_report, recommend_for_anonymous, hybrid_branches
+from .recommender_content import stored_user_profile
+from .recommender_store import STORE
+
+# Cache alias used for recommendation lists (see CACHES in settings)
+CACHE_ALIAS = 'recommendations'
+
+
+def recommendation_cache():
+    return caches[getattr(settings, 'RECOMMENDER_CACHE_ALIAS', CACHE_ALIAS)]
+
+
+def user_generation(user_id):
+    """
+    Generation of a user's cached recommendations, changed whenever their feedback changes.
+    It is kept in the database, so feedback handled by any worker invalidates the lists cached by all of them.
+    """
+    return UserProfile.objects.filter(user_id=user_id).values_list('recommendations_generation', flat=True).first() or 0
+
+
+def invalidate_user_recommendations(user_id):
+    """Make every cached recommendation list of a user unreachable."""
+    generation = F('recommendations_generation') + 1
+    if not UserProfile.objects.filter(user_id=user_id).update(recommendations_generation=generation):
+        # The profile is built from the whole history, then counted like any other
+        stored_user_profile(user_id)
+        UserProfile.objects.filter(user_id=user_id).update(recommendations_generation=generation)
+
+
+def cached_recommend_hybrid(user, limit=10):
+    """
+    recommend_hybrid served from the cache, keyed by user, limit, feedback generation and precomputed data version.
+    Cache misses run the hybrid branches concurrently when RECOMMENDER_LATENCY_BUDGET is set.
+    """
+    cache = recommendation_cache()
+    key = f'recs:user:{user.pk}:{limit}:{user_generation(user.pk)}:{STORE.get("version")}'
+    results = cache.get(key)
+    if results is None:
+        budget = getattr(settings, 'RECOMMENDER_LATENCY_BUDGET', None)
+        results, completed = recommend_hybrid_report(user, limit=limit, budget=budget)
+        # Lists degraded by a missed deadline are served but not cached
+        if 'popularity' in completed or set(completed) == set(hybrid_branches()):
+            cache.set(key, results)
+    return results
+
+
+def cached_recommend_for_anonymous(limit=10):
+    """recommend_for_anonymous served from the cache, keyed by limit and precomputed data version."""
+    cache = recommendation_cache()
+    key = f'recs:anonymous:{limit}:{STORE.get("version")}'
+    results = cache.get(key)
+    if results is None:
+        results = recommend_for_anonymous(limit=limit)
+        cache.set(key, results)
+    return results
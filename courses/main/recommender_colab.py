@@ -1,50 +1,117 @@
 from math import sqrt
 import math
 from collections import defaultdict
-from .models import UserCourse, Course
-import shelve
+from django.conf import settings
+from django.db.models import Count
+from .models import UserCourse, Course, CourseNeighbours
+from .recommender_store import STORE, load_precomputed_data
 
-SHELVE_FILE = "precomputed_recommender_system_courses.db"
+# Co-raters compared with a user by user-based filtering (those sharing the most courses first)
+MAX_CO_RATERS = 500
 
-def build_prefs():
+def interaction_rating(uc):
+    """Collaborative rating derived from a UserCourse interaction."""
+    rating = 0.0
+
+    if uc.liked:
+        rating += 1.0
+    if uc.disliked:
+        rating -= 1.0
+    if uc.viewed > 0:
+        rating += 0.2 * math.log(uc.viewed + 1) # Standard for implicit feedback
+
+    return rating
+
+def build_prefs(qs=None):
     """
     prefs[user_id][course_id] = rating
     """
     prefs = defaultdict(dict)
 
-    qs = UserCourse.objects.select_related('user', 'course')
+    if qs is None:
+        qs = UserCourse.objects.select_related('user', 'course')
 
     for uc in qs:
-        rating = 0.0
-
-        if uc.liked:
-            rating += 1.0
-        if uc.disliked:
-            rating -= 1.0
-        if uc.viewed > 0:
-            rating += 0.2 * math.log(uc.viewed + 1) # Standard for implicit feedback
+        rating = interaction_rating(uc)
 
         if rating != 0:
             prefs[uc.user_id][uc.course_id] = rating
 
     return prefs
 
-def load_precomputed_data():
-    """Load precomputed data from shelve."""
-    with shelve.open(SHELVE_FILE) as db:
-        course_features_dict = db.get('course_features', {})
-        item_sim = db.get('item_sim', {})
-    return course_features_dict, item_sim
+def build_user_prefs(user_id):
+    """Ratings of a single user: {course_id: rating}."""
+    return build_prefs(UserCourse.objects.filter(user_id=user_id)).get(user_id, {})
+
+def build_co_rater_prefs(user_id, max_users=None):
+    """
+    prefs of user_id and of the users who rated some of the same courses, read from the database on
+    every call so they are never stale. Only the max_users co-raters sharing the most courses are kept.
+    """
+    ratings = build_user_prefs(user_id)
+    if not ratings:
+        return {}
+
+    co_raters = (
+        UserCourse.objects
+        .filter(course_id__in=list(ratings))
+        .exclude(user_id=user_id)
+        .values('user_id')
+        .annotate(shared=Count('id'))
+        .order_by('-shared', 'user_id')
+    )
+    if max_users:
+        co_raters = co_raters[:max_users]
+
+    prefs = build_prefs(UserCourse.objects.filter(user_id__in=[row['user_id'] for row in co_raters]))
+    prefs[user_id] = ratings
+    return prefs
 
 def recommend_collaborative(user, limit=10):
-    # Use item-based collaborative filtering
-    prefs = build_prefs()
-    item_sim = load_precomputed_data()[1]
+    """Matrix factorization recommendations, folded in from the user's current ratings."""
+    model = STORE.get('mf_model')
+    if model is None:
+        # Nothing to train on at the last precompute: fall back to item-based collaborative filtering
+        return recommend_item_based(user, limit)
+
+    user_prefs = build_user_prefs(user.id)
+    if not user_prefs:
+        return []
 
+    # One dot product against every course factor, independent of neighbours and interactions
+    rankings = model.recommend(user_prefs, limit=limit)
+    return rankings_to_courses(rankings, limit)
+
+def recommend_item_based(user, limit=10):
+    """Item-based collaborative filtering over the precomputed item similarities, as corrected after feedback."""
+    user_prefs = build_user_prefs(user.id)
+    if not user_prefs:
+        return []
+
+    rankings = getRecommendedItems({user.id: user_prefs}, item_neighbours(user_prefs), user.id)
+    return rankings_to_courses(rankings, limit)
+
+def item_neighbours(course_ids):
+    """item_sim rows of the courses, the ones recomputed after feedback (CourseNeighbours) replacing the snapshot's."""
+    item_sim = load_precomputed_data()[1]
+    rows = {cid: item_sim.get(cid) or item_sim.get(str(cid)) or [] for cid in course_ids}
+    recomputed = CourseNeighbours.objects.filter(course_id__in=list(rows), snapshot_version=STORE.get('version'))
+    for course_id, neighbours in recomputed.values_list('course_id', 'neighbours'):
+        rows[course_id] = [tuple(pair) for pair in neighbours]
+    return rows
+
+def recommend_user_based(user, limit=10):
+    """User-based collaborative filtering, comparing the user only with those who co-rated some course."""
+    prefs = build_co_rater_prefs(user.id, getattr(settings, 'RECOMMENDER_MAX_CO_RATERS', MAX_CO_RATERS))
     if user.id not in prefs:
         return []
 
-    rankings = getRecommendedItems(prefs, item_sim, user.id)
+    # The inverted index only needs the postings of the user's courses, all of them among the co-raters
+    rankings = get_recommendations_co_raters(prefs, transformPrefs(prefs), user.id)
+    return rankings_to_courses(rankings, limit)
+
+def rankings_to_courses(rankings, limit):
+    """Hydrate the first limit (score, course_id) rankings into [{'course': Course, 'score': score}]."""
     course_ids = [cid for _, cid in rankings[:limit]]
     courses = Course.objects.filter(id__in=course_ids)
     score_map = {cid: score for score, cid in rankings}
@@ -56,6 +123,62 @@ def recommend_collaborative(user, limit=10):
 
 
 
+def pearson_co_raters(prefs, item_users, person):
+    """
+    sim_pearson between person and every user who co-rated at least one of their items.
+    The sums over mutually rated items of every pair are accumulated in a single pass
+    over the postings of person's items in the item -> users inverted index.
+    """
+    # other -> [n, sum1, sum2, sum1Sq, sum2Sq, pSum]
+    stats = {}
+    for item, r1 in prefs[person].items():
+        for other, r2 in item_users.get(item, {}).items():
+            if other == person:
+                continue
+            acc = stats.get(other)
+            if acc is None:
+                acc = stats[other] = [0, 0.0, 0.0, 0.0, 0.0, 0.0]
+            acc[0] += 1
+            acc[1] += r1
+            acc[2] += r2
+            acc[3] += r1 * r1
+            acc[4] += r2 * r2
+            acc[5] += r1 * r2
+
+    sims = {}
+    for other, (n, sum1, sum2, sum1Sq, sum2Sq, pSum) in stats.items():
+        num = pSum - (sum1 * sum2 / n)
+        den = sqrt(max((sum1Sq - pow(sum1, 2) / n) * (sum2Sq - pow(sum2, 2) / n), 0))
+        sims[other] = num / den if den != 0 else 0
+    return sims
+
+def top_matches_co_raters(prefs, item_users, person, n=5):
+    """topMatches with sim_pearson restricted to co-raters (everyone else scores 0 and is not listed)."""
+    scores = [(sim, other) for other, sim in pearson_co_raters(prefs, item_users, person).items()]
+    scores.sort()
+    scores.reverse()
+    return scores[0:n]
+
+def get_recommendations_co_raters(prefs, item_users, person):
+    """getRecommendations with sim_pearson, only visiting users who co-rated some course with person."""
+    totals = {}
+    simSums = {}
+    for other, sim in pearson_co_raters(prefs, item_users, person).items():
+        # ignore scores of zero or lower
+        if sim <= 0: continue
+        for item, rating in prefs[other].items():
+            # only score courses the user hasn't rated yet
+            if item not in prefs[person] or prefs[person][item] == 0:
+                totals[item] = totals.get(item, 0) + rating * sim
+                simSums[item] = simSums.get(item, 0) + sim
+
+    rankings = [(total / simSums[item], item) for item, total in totals.items()]
+    rankings.sort()
+    rankings.reverse()
+    return rankings
+
+
+
 # ---- GIVEN IN THE AII COURSE: -----
 
 # Returns a distance-based similarity score for person1 and person2
@@ -65,14 +188,14 @@ def sim_distance(prefs, person1, person2):
     for item in prefs[person1]: 
         if item in prefs[person2]: si[item] = 1
 
-        # if they have no ratings in common, return 0
-        if len(si) == 0: return 0
+    # if they have no ratings in common, return 0
+    if len(si) == 0: return 0
 
-        # Add up the squares of all the differences
-        sum_of_squares = sum([pow(prefs[person1][item] - prefs[person2][item], 2) 
-                    for item in prefs[person1] if item in prefs[person2]])
-        
-        return 1 / (1 + sum_of_squares)
+    # Add up the squares of all the differences
+    sum_of_squares = sum([pow(prefs[person1][item] - prefs[person2][item], 2) 
+                for item in prefs[person1] if item in prefs[person2]])
+    
+    return 1 / (1 + sum_of_squares)
 
 # Returns the Pearson correlation coefficient for p1 and p2
 def sim_pearson(prefs, p1, p2):
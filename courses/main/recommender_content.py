@@ -1,13 +1,11 @@
-from .models import UserCourse, Course
+from .models import UserCourse, Course, UserProfile
 from whoosh.query import Term
-from collections import defaultdict
 import math
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import Q
-import shelve
-from .populateDB import open_whoosh
-
-SHELVE_FILE = "precomputed_recommender_system_courses.db"
+from .search import SEARCHERS
+from .recommender_store import STORE, load_precomputed_data
 
 # Weights for different features
 FEATURE_WEIGHTS = {
@@ -19,14 +17,6 @@ FEATURE_WEIGHTS = {
     "kw": 0.6,      
 }
 
-def load_precomputed_data():
-    """Load precomputed data from shelve."""
-    with shelve.open(SHELVE_FILE) as db:
-        course_features_dict = db.get('course_features', {})
-        item_sim = db.get('item_sim', {})
-    return course_features_dict, item_sim
-
-
 def get_user_feedback(user):
     liked = UserCourse.objects.filter(user=user, liked=True).select_related('course')
     disliked = UserCourse.objects.filter(user=user, disliked=True).select_related('course')
@@ -34,7 +24,35 @@ def get_user_feedback(user):
     return liked, disliked, viewed
 
 
-def course_features(course):
+def parse_keywords(raw):
+    """Keywords stored in the Whoosh index as a comma separated string."""
+    return [kw.strip().lower() for kw in (raw or '').split(',') if kw.strip()]
+
+
+def stored_keywords():
+    """{url: [keyword, ...]} for every indexed course, read in a single pass over the stored fields."""
+    with SEARCHERS.searcher() as searcher:
+        return {
+            fields['url']: parse_keywords(fields.get('keywords'))
+            for fields in searcher.all_stored_fields()
+            if fields.get('url')
+        }
+
+
+def bulk_course_features(course_ids=None):
+    """
+    Features of many courses at once: {course_id: [feature, ...]}.
+    Opens one searcher for all keywords and fetches the courses in one query with their relations.
+    """
+    keywords = stored_keywords()
+    courses = Course.objects.select_related('category', 'platform', 'instructor')
+    if course_ids is not None:
+        courses = courses.filter(id__in=course_ids)
+    return {course.id: course_features(course, keywords.get(course.url, [])) for course in courses}
+
+
+def course_features(course, keywords=None):
+    """Feature list of a course. Keywords are looked up in Whoosh unless they are given."""
     features = []
 
     # Basic features
@@ -63,16 +81,15 @@ def course_features(course):
         features.append(dur_feat)
 
     # Keywords
-    ix = open_whoosh()
-    keywords = []
-    with ix.searcher() as searcher:
+    if keywords is None:
+        keywords = []
+        with SEARCHERS.searcher() as searcher:
 
-        base_query = Term('url', course.url)
-        base_results = searcher.search(base_query, limit=1)
+            base_query = Term('url', course.url)
+            base_results = searcher.search(base_query, limit=1)
 
-        if base_results:
-            raw_base = base_results[0].get('keywords', '') or ''
-            keywords = [kw.strip().lower() for kw in raw_base.split(',') if kw.strip()]
+            if base_results:
+                keywords = parse_keywords(base_results[0].get('keywords'))
 
     for kw in keywords:
         features.append(f"kw:{kw}")
@@ -80,45 +97,108 @@ def course_features(course):
     return features
 
 
-def build_user_profile(user):
-    profile = defaultdict(float)
+def interaction_weight(uc):
+    """Signed weight of a user's interaction with a course, before time decay."""
+    weight = 0.0
 
-    # Try to use precomputed course features (fallback to computing on the fly)
-    course_features_dict, _ = load_precomputed_data()
+    if uc.liked:
+        weight += 4.0 # high positive weight
+
+    if uc.disliked:
+        weight -= 5.0 # high negative weight
+
+    if uc.viewed > 0:
+        weight += math.sqrt(uc.viewed) # increasing but moderate positive weight
 
-    interactions = UserCourse.objects.filter(user=user)
+    return weight
 
-    for uc in interactions:
-        decay = time_decay(uc.timestamp) # More recent interactions have higher weight
 
-        weight = 0.0
+def add_course_to_profile(vector, course_features_dict, uc, weight):
+    """Add weight times the weighted features of the interaction's course to an unnormalised profile vector."""
+    # Prefer precomputed features keyed by course id (int or str), else compute
+    feats = course_features_dict.get(uc.course_id) or course_features_dict.get(str(uc.course_id))
+    if feats is None:
+        feats = course_features(uc.course)
 
-        if uc.liked:
-            weight += 4.0 # high positive weight
+    for feat in feats:
+        kind = feat.split(":", 1)[0]
+        feat_weight = FEATURE_WEIGHTS.get(kind, 1.0)
+        vector[feat] = vector.get(feat, 0.0) + weight * feat_weight
 
-        if uc.disliked:
-            weight -= 5.0 # high negative weight
 
-        if uc.viewed > 0:
-            weight += math.sqrt(uc.viewed) # increasing but moderate positive weight
-        
-        weight *= decay
+def rebuild_user_profile(user_id):
+    """Build the stored profile of a user from their whole interaction history, decayed to the current time."""
+    now = timezone.now()
+    course_features_dict, _ = load_precomputed_data()
+    vector, weights = {}, {}
 
+    for uc in UserCourse.objects.filter(user_id=user_id):
+        weight = interaction_weight(uc)
         if weight == 0:
             continue
+        weights[str(uc.course_id)] = weight
+        add_course_to_profile(vector, course_features_dict, uc, weight * decay_between(uc.timestamp, now))
+
+    profile, _ = UserProfile.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            'vector': vector,
+            'weights': weights,
+            'reference_time': now,
+            'snapshot_version': STORE.get('version'),
+        },
+    )
+    return profile
+
+
+def stored_user_profile(user_id):
+    """Stored profile of a user, rebuilt if it does not exist or was built with other precomputed features."""
+    profile = UserProfile.objects.filter(user_id=user_id).first()
+    if profile is None or profile.snapshot_version != STORE.get('version'):
+        profile = rebuild_user_profile(user_id)
+    return profile
+
+
+def update_user_profile(user_id, course_id):
+    """
+    Apply a change in one interaction to the stored profile of a user.
+    The stored vector is decayed to its reference time, so it is first moved to the current time with a
+    single factor, then the difference between the new and the previously applied weight of the course is added.
+    """
+    with transaction.atomic():
+        profile = UserProfile.objects.select_for_update().filter(user_id=user_id).first()
+        uc = UserCourse.objects.filter(user_id=user_id, course_id=course_id).first()
+        old_weight = profile.weights.get(str(course_id), 0.0) if profile is not None else 0.0
+        new_weight = interaction_weight(uc) if uc is not None else 0.0
+
+        if profile is None or profile.snapshot_version != STORE.get('version') or uc is None:
+            rebuild_user_profile(user_id)
+            return
+        if new_weight == old_weight:
+            return
+
+        now = timezone.now()
+        factor = decay_between(profile.reference_time, now)
+        vector = {feat: value * factor for feat, value in profile.vector.items()}
+        course_features_dict, _ = load_precomputed_data()
+        add_course_to_profile(vector, course_features_dict, uc, (new_weight - old_weight) * decay_between(uc.timestamp, now))
+
+        # Undone interactions leave rounding residue behind
+        profile.vector = {feat: value for feat, value in vector.items() if abs(value) > 1e-12}
+        if new_weight == 0:
+            profile.weights.pop(str(course_id), None)
+        else:
+            profile.weights[str(course_id)] = new_weight
+        profile.reference_time = now
+        profile.save(update_fields=['vector', 'weights', 'reference_time'])
 
-        # Prefer precomputed features keyed by course id (int or str), else compute
-        feats = course_features_dict.get(uc.course_id) or course_features_dict.get(str(uc.course_id))
-        if feats is None:
-            feats = course_features(uc.course)
-
-        for feat in feats:
-            kind = feat.split(":", 1)[0]
-            feat_weight = FEATURE_WEIGHTS.get(kind, 1.0)
-            profile[feat] += weight * feat_weight
 
+def build_user_profile(user):
+    """Normalised content profile of a user, read from the stored profile instead of their interaction history."""
+    profile = stored_user_profile(getattr(user, 'pk', user))
 
-    return normalize_profile(profile)
+    # Decaying the stored vector to now scales every feature alike, which normalisation cancels out
+    return normalize_profile(profile.vector)
 
 def normalize_profile(profile):
     """Normalize profile vector to unit length."""
@@ -130,8 +210,15 @@ def normalize_profile(profile):
 
 def time_decay(timestamp, half_life_days=30):
     """Calculate a decay factor based on the age of the interaction. At half_life_days, the weight is halved."""
-    now = timezone.now()
-    days = (now - timestamp).days
+    return decay_between(timestamp, timezone.now(), half_life_days)
+
+
+def decay_between(start, end, half_life_days=30):
+    """
+    Decay accumulated from start to end. Fractional days are used so that decaying to an intermediate
+    time and then to end gives the same factor as decaying to end directly.
+    """
+    days = (end - start).total_seconds() / 86400
     return math.exp(-days / half_life_days)
 
 
@@ -143,9 +230,6 @@ def similarity(user_profile, course_features):
     return score / len(course_features)
 
 def recommend_content_courses(user, limit=10):
-    # Load precomputed course features to avoid recomputing per candidate
-    course_features_dict, _ = load_precomputed_data()
-
     user_profile = build_user_profile(user)
 
     # Only consider courses the user explicitly liked or disliked as "interacted"
@@ -156,6 +240,15 @@ def recommend_content_courses(user, limit=10):
         .values_list('course_id', flat=True)
     )
 
+    feature_index = STORE.get('feature_index')
+    if feature_index is not None:
+        # Only courses sharing a feature with the profile are scored; only the winners are fetched
+        top = feature_index.top_courses(user_profile, limit=limit, exclude=interacted)
+        courses = Course.objects.in_bulk([cid for _, cid in top])
+        return [{'course': courses[cid], 'score': score} for score, cid in top if cid in courses]
+
+    # Older snapshots without a feature index: score course by course
+    course_features_dict, _ = load_precomputed_data()
     recommendations = []
 
     for course in Course.objects.exclude(id__in=interacted):
@@ -0,0 +1,216 @@
+import heapq
+
+import numpy as np
+from scipy import sparse
+
+
+def build_rating_matrix(prefs):
+    """
+    Build a sparse user x course rating matrix from prefs[user_id][course_id] = rating.
+    Returns (matrix, user_ids, course_ids), where rows follow user_ids and columns course_ids.
+    """
+    user_ids = sorted(prefs)
+    course_ids = sorted({cid for ratings in prefs.values() for cid in ratings})
+    user_index = {uid: i for i, uid in enumerate(user_ids)}
+    course_index = {cid: j for j, cid in enumerate(course_ids)}
+
+    rows, cols, data = [], [], []
+    for uid, ratings in prefs.items():
+        for cid, rating in ratings.items():
+            if rating == 0:
+                continue
+            rows.append(user_index[uid])
+            cols.append(course_index[cid])
+            data.append(rating)
+
+    matrix = sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float64), (rows, cols)),
+        shape=(len(user_ids), len(course_ids)),
+    )
+    return matrix, user_ids, course_ids
+
+
+def rating_operands(ratings):
+    """Column-oriented rating, co-rating indicator and squared rating matrices used by the similarity blocks."""
+    ratings = ratings.tocsc()
+    rated = ratings.copy()
+    rated.data = np.ones_like(rated.data)
+    squares = ratings.multiply(ratings).tocsc()
+    return ratings, rated, squares
+
+
+def distance_similarity_block(operands, columns):
+    """
+    Euclidean-distance similarity (as in sim_distance) between the given course columns and every course.
+    Only pairs with at least one co-rater are stored, so the result is a sparse len(columns) x n_courses matrix
+    whose values are 1 / (1 + sum of squared rating differences over the co-raters).
+    """
+    ratings, rated, squares = operands
+    block = ratings[:, columns]
+    block_rated = rated[:, columns]
+    block_squares = squares[:, columns]
+
+    # sum over co-raters of (a - b)^2 = sum a^2 + sum b^2 - 2 sum ab
+    distance = (
+        block_squares.T @ rated
+        + block_rated.T @ squares
+        - 2 * (block.T @ ratings)
+    )
+    overlap = (block_rated.T @ rated).tocsr()
+    overlap.data = np.ones_like(overlap.data)
+
+    # Adding the co-rating pattern keeps pairs with identical ratings (distance 0) as explicit entries
+    similarity = (distance + overlap).tocsr()
+    # Rounding absorbs the cancellation error of the expansion above so equal distances tie exactly
+    similarity.data = np.round(1.0 / np.maximum(similarity.data, 1.0), 12)
+
+    # Drop each course's similarity with itself (entry (i, columns[i]) always exists)
+    similarity[np.arange(len(columns)), columns] = 0
+    similarity.eliminate_zeros()
+    return similarity
+
+
+def top_neighbours(similarity, course_ids, columns, n=10):
+    """
+    Keep the n best neighbours of each row of a similarity block.
+    Returns {course_id: [(similarity, other_course_id), ...]} sorted like topMatches.
+    """
+    ids = np.asarray(course_ids)
+    result = {}
+    for i, column in enumerate(columns):
+        row_start, row_end = similarity.indptr[i], similarity.indptr[i + 1]
+        scores = similarity.data[row_start:row_end]
+        others = ids[similarity.indices[row_start:row_end]]
+
+        # Highest similarity first, ties broken by the highest id (same order as topMatches)
+        order = np.lexsort((-others, -scores))[:n]
+        result[course_ids[column]] = [(float(scores[k]), others[k].item()) for k in order]
+    return result
+
+
+def calculate_similar_items_sparse(prefs, n=10, block_size=1000):
+    """
+    Vectorized equivalent of calculateSimilarItems using sparse matrix products.
+    The rating matrix is built once and similarities are computed in blocks of courses,
+    so memory stays bounded by block_size x n_courses.
+    Only neighbours sharing at least one rater are kept (topMatches pads with zero-similarity items).
+    """
+    ratings, _, course_ids = build_rating_matrix(prefs)
+    operands = rating_operands(ratings)
+    result = {}
+    for columns in column_blocks(len(course_ids), block_size):
+        result.update(similar_items_block(operands, course_ids, columns, n=n))
+    return result
+
+
+def column_blocks(n_courses, block_size):
+    """Consecutive column index blocks of at most block_size courses."""
+    return [np.arange(start, min(start + block_size, n_courses)) for start in range(0, n_courses, block_size)]
+
+
+def similar_items_block(operands, course_ids, columns, n=10):
+    """Top-n neighbours of the courses in the given columns, as {course_id: [(similarity, other), ...]}."""
+    similarity = distance_similarity_block(operands, columns)
+    return top_neighbours(similarity, course_ids, columns, n=n)
+
+
+def similar_items_for(prefs, items, n=10):
+    """
+    Recompute the neighbour lists of the given courses only.
+    prefs must hold the complete ratings of every user who rated those courses,
+    which is all the distance similarity of their rows depends on.
+    Courses without any co-rated neighbour map to an empty list.
+    """
+    ratings, _, course_ids = build_rating_matrix(prefs)
+    course_index = {cid: j for j, cid in enumerate(course_ids)}
+    columns = np.array([course_index[cid] for cid in items if cid in course_index], dtype=np.int64)
+
+    result = {cid: [] for cid in items}
+    if len(columns):
+        result.update(similar_items_block(rating_operands(ratings), course_ids, columns, n=n))
+    return result
+
+
+def build_feature_matrix(course_features_dict, weights):
+    """
+    Build a sparse course x feature matrix from {course_id: [feature, ...]}.
+    Each feature is weighted by its kind ("cat", "kw", ...) and every row is normalised to unit length.
+    Returns (matrix, course_ids, features), where rows follow course_ids and columns features.
+    """
+    course_ids = sorted(course_features_dict, key=int)
+    features = sorted({f for feats in course_features_dict.values() for f in feats})
+    feature_index = {f: j for j, f in enumerate(features)}
+
+    rows, cols, data = [], [], []
+    for i, cid in enumerate(course_ids):
+        for feat in set(course_features_dict[cid]):
+            rows.append(i)
+            cols.append(feature_index[feat])
+            data.append(weights.get(feat.split(":", 1)[0], 1.0))
+
+    matrix = sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float64), (rows, cols)),
+        shape=(len(course_ids), len(features)),
+    )
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    matrix = sparse.diags(1.0 / norms) @ matrix
+    return matrix.tocsr(), [int(cid) for cid in course_ids], features
+
+
+class FeatureMatrix:
+    """Weighted, row-normalised course x feature matrix, with the course ids and features of its rows and columns."""
+
+    def __init__(self, matrix, course_ids, features):
+        self.matrix = matrix
+        self.course_ids = np.asarray(course_ids, dtype=np.int64)
+        self.features = list(features)
+
+    @classmethod
+    def build(cls, course_features_dict, weights):
+        return cls(*build_feature_matrix(course_features_dict, weights))
+
+
+class FeatureIndex:
+    """
+    Inverted index feature -> (course ids, weights) with the weights of the FeatureMatrix,
+    so a profile only touches the postings of its own features.
+    """
+
+    def __init__(self, postings):
+        self.postings = postings
+
+    def __len__(self):
+        return len(self.postings)
+
+    @classmethod
+    def from_matrix(cls, feature_matrix):
+        by_feature = feature_matrix.matrix.tocsc()
+        postings = {}
+        for j, feat in enumerate(feature_matrix.features):
+            start, end = by_feature.indptr[j], by_feature.indptr[j + 1]
+            postings[feat] = (feature_matrix.course_ids[by_feature.indices[start:end]], by_feature.data[start:end])
+        return cls(postings)
+
+    def top_courses(self, profile, limit=10, exclude=()):
+        """
+        Best scoring courses for a {feature: weight} profile as [(score, course_id), ...], highest first.
+        Scores are accumulated over the postings of the profile's non-zero features and the
+        top-k is taken with a heap; only positive scores are returned.
+        """
+        id_parts, score_parts = [], []
+        for feat, weight in profile.items():
+            posting = self.postings.get(feat)
+            if posting is None or weight == 0:
+                continue
+            id_parts.append(posting[0])
+            score_parts.append(weight * posting[1])
+        if not id_parts:
+            return []
+
+        candidates, inverse = np.unique(np.concatenate(id_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+        return heapq.nlargest(limit, (
+            (score, cid) for score, cid in zip(scores.tolist(), candidates.tolist())
+            if score > 0 and cid not in exclude
+        ))
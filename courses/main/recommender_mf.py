@@ -0,0 +1,107 @@
+import numpy as np
+
+from .recommender_matrix import build_rating_matrix
+
+
+def least_squares_rows(ratings, fixed, regularization, alpha):
+    """
+    One implicit-ALS half step (Hu, Koren & Volinsky): solve the factors of every row of ratings
+    keeping the other side fixed. Preference is 1 for positive ratings, 0 otherwise, with
+    confidence 1 + alpha * |rating| on every observed interaction.
+    """
+    n_factors = fixed.shape[1]
+    gram = fixed.T @ fixed
+    identity = regularization * np.eye(n_factors)
+    solved = np.zeros((ratings.shape[0], n_factors))
+
+    for row in range(ratings.shape[0]):
+        start, end = ratings.indptr[row], ratings.indptr[row + 1]
+        if start == end:
+            continue
+        cols = ratings.indices[start:end]
+        values = ratings.data[start:end]
+        solved[row] = solve_row(fixed[cols], values, gram, identity, alpha)
+    return solved
+
+
+def solve_row(fixed_rows, values, gram, identity, alpha):
+    """Factors of a single user or item given the fixed factors of the rows it interacted with."""
+    confidence = 1.0 + alpha * np.abs(values)
+    preference = (values > 0).astype(np.float64)
+    a = gram + (fixed_rows.T * (confidence - 1.0)) @ fixed_rows + identity
+    b = (fixed_rows.T * confidence) @ preference
+    return np.linalg.solve(a, b)
+
+
+class ImplicitMF:
+    """
+    Course factor matrix of an implicit-feedback matrix factorization model. Users are not stored:
+    their factors are folded in from their current ratings on every request, so feedback given
+    after training is taken into account without retraining.
+    """
+
+    def __init__(self, course_ids, item_factors, regularization, alpha):
+        self.course_ids = np.asarray(course_ids, dtype=np.int64)
+        self.item_factors = item_factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self._prepare()
+
+    def _prepare(self):
+        self.course_positions = {cid: j for j, cid in enumerate(self.course_ids.tolist())}
+        self.gram = self.item_factors.T @ self.item_factors
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for derived in ('course_positions', 'gram'):
+            state.pop(derived)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._prepare()
+
+    def user_vector(self, ratings):
+        """
+        Factors of a user with these {course_id: rating}, solved against the fixed course factors
+        (one factors x factors system), or None if none of the courses was in the training data.
+        """
+        known = [(self.course_positions[cid], rating) for cid, rating in ratings.items() if cid in self.course_positions]
+        if not known:
+            return None
+        cols, values = zip(*known)
+        identity = self.regularization * np.eye(self.item_factors.shape[1])
+        return solve_row(self.item_factors[list(cols)], np.asarray(values), self.gram, identity, self.alpha)
+
+    def recommend(self, ratings, limit=10):
+        """Top courses for a user with these ratings as [(score, course_id), ...], excluding the rated courses."""
+        vector = self.user_vector(ratings)
+        if vector is None:
+            return []
+
+        scores = self.item_factors @ vector
+        rated = [self.course_positions[cid] for cid in ratings if cid in self.course_positions]
+        scores[rated] = -np.inf
+
+        limit = min(limit, len(scores) - len(rated))
+        if limit <= 0:
+            return []
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(float(scores[j]), self.course_ids[j].item()) for j in top]
+
+
+def train_als(prefs, factors=32, regularization=0.1, alpha=10.0, iterations=15, seed=0):
+    """Train an implicit-feedback matrix factorization model on prefs[user_id][course_id] = rating with ALS."""
+    ratings, user_ids, course_ids = build_rating_matrix(prefs)
+    by_item = ratings.T.tocsr()
+
+    rng = np.random.default_rng(seed)
+    user_factors = rng.normal(scale=0.01, size=(len(user_ids), factors))
+    item_factors = rng.normal(scale=0.01, size=(len(course_ids), factors))
+
+    for _ in range(iterations):
+        user_factors = least_squares_rows(ratings, item_factors, regularization, alpha)
+        item_factors = least_squares_rows(by_item, user_factors, regularization, alpha)
+
+    return ImplicitMF(course_ids, item_factors, regularization, alpha)
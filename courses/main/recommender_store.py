@@ -0,0 +1,152 @@
+import os
+import shelve
+import threading
+import time
+
+from django.conf import settings
+
+SHELVE_FILE = "precomputed_recommender_system_courses.db"
+
+# Files a shelve may be stored in, depending on the dbm backend
+SHELVE_SUFFIXES = ('', '.db', '.dat', '.dir', '.bak')
+
+# File next to the shelve holding the 'version' of the snapshot it contains
+VERSION_SUFFIX = '.version'
+
+
+class PrecomputedStore:
+    """
+    Process-resident copy of the precomputed recommender shelve.
+    The whole shelve is loaded once per worker and reused by every request. Each access compares the
+    version file written with a new 'version' entry (by precalculate_data) with the loaded snapshot and,
+    when a newer one was published, loads it and swaps it in atomically. Writes to other keys do not
+    make other workers reload the whole shelve.
+    """
+
+    def __init__(self, path=None):
+        self._path = path
+        self._lock = threading.Lock()
+        # (disk version, {key: value}), replaced as a whole so readers always see one consistent snapshot
+        self._snapshot = None
+        self.hits = 0
+        self.loads = 0
+        self.load_time = 0.0
+        self.loaded_at = None
+
+    @property
+    def path(self):
+        return self._path or getattr(settings, 'RECOMMENDER_SHELVE_FILE', SHELVE_FILE)
+
+    def disk_version(self):
+        """
+        Contents of the version file; changes whenever a snapshot with a new 'version' is written.
+        Shelves written before version files existed are versioned by the modification times of their files.
+        """
+        try:
+            with open(self.path + VERSION_SUFFIX) as f:
+                return f.read()
+        except OSError:
+            pass
+        version = []
+        for suffix in SHELVE_SUFFIXES:
+            try:
+                st = os.stat(self.path + suffix)
+            except OSError:
+                continue
+            version.append((suffix, st.st_mtime_ns, st.st_size))
+        return tuple(version)
+
+    def snapshot(self):
+        """Current {key: value} snapshot, (re)loaded from disk if it changed since the last load."""
+        version = self.disk_version()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot[0] == version:
+            self.hits += 1
+            return snapshot[1]
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot[0] == self.disk_version():
+                self.hits += 1
+                return snapshot[1]
+
+            start = time.perf_counter()
+            for _ in range(3):
+                version = self.disk_version()
+                data = self._read() if version else {}
+                # Retry if the shelve was written while it was being read
+                if self.disk_version() == version:
+                    break
+            self.load_time = time.perf_counter() - start
+            self.loads += 1
+            self.loaded_at = time.time()
+            self._snapshot = (version, data)
+            return data
+
+    def _read(self):
+        with shelve.open(self.path, 'r') as db:
+            return {key: db[key] for key in db.keys()}
+
+    def get(self, key, default=None):
+        return self.snapshot().get(key, default)
+
+    def update(self, values):
+        """
+        Write some keys to the shelve and to the in-memory snapshot, without reloading the rest.
+        Other workers reload the shelve only if values has a new 'version', which is published last.
+        """
+        with self._lock:
+            snapshot = self._snapshot
+            data = dict(snapshot[1]) if snapshot is not None and snapshot[0] == self.disk_version() else None
+            with shelve.open(self.path) as db:
+                for key, value in values.items():
+                    db[key] = value
+            if 'version' in values:
+                self._write_version(values['version'])
+            if data is not None:
+                data.update(values)
+                self._snapshot = (self.disk_version(), data)
+
+    def _write_version(self, version):
+        # Replaced atomically, so readers never see a partial version
+        tmp = f"{self.path}{VERSION_SUFFIX}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(repr(version))
+        os.replace(tmp, self.path + VERSION_SUFFIX)
+
+    def invalidate(self):
+        """Drop the loaded snapshot; the next access reloads it from disk."""
+        with self._lock:
+            self._snapshot = None
+
+    def size_bytes(self):
+        """Size of the shelve files on disk."""
+        size = 0
+        for suffix in SHELVE_SUFFIXES:
+            try:
+                size += os.stat(self.path + suffix).st_size
+            except OSError:
+                continue
+        return size
+
+    def stats(self):
+        """Load count, last load time, size and hit counters of the store."""
+        snapshot = self._snapshot
+        data = snapshot[1] if snapshot is not None else {}
+        return {
+            'version': data.get('version'),
+            'keys': len(data),
+            'size_bytes': self.size_bytes(),
+            'loads': self.loads,
+            'hits': self.hits,
+            'load_time': self.load_time,
+            'loaded_at': self.loaded_at,
+        }
+
+
+STORE = PrecomputedStore()
+
+
+def load_precomputed_data():
+    """Precomputed course features and item similarities from the process-resident store."""
+    return STORE.get('course_features', {}), STORE.get('item_sim', {})
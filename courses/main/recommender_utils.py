@@ -1,23 +1,215 @@
-from .recommender_content import course_features
-from .recommender_colab import build_prefs, calculateSimilarItems
-import shelve
-from .models import Course
+from .recommender_content import bulk_course_features, FEATURE_WEIGHTS, update_user_profile
+from .recommender_colab import build_prefs
+from .recommender_matrix import build_rating_matrix, rating_operands, similar_items_block, similar_items_for, FeatureMatrix, FeatureIndex
+from .recommender_mf import train_als
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import django
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from .models import Course, UserCourse, CourseNeighbours
+from .recommender_store import STORE
+from .recommender_cache import invalidate_user_recommendations
+from .recommender import refresh_popularity, update_course_popularity, item_similarities_used
 
-SHELVE_FILE = "precomputed_recommender_system_courses.db"
+# Raters of each course read to recompute its neighbour list after feedback (the most recent ones)
+MAX_RATERS_PER_COURSE = 200
+
+# Seconds feedback is gathered before the neighbour lists it touched are recomputed together
+ITEM_SIM_DELAY = 5.0
+
+def precalculate_data(workers=None):
+    """
+    Precompute course features and collaborative data and store them in the shelve behind STORE.
+    With more than one worker, course features and neighbour lists are computed in a process pool,
+    sharded by course, and the shards are merged before being stored.
+    """
+    if workers is None:
+        workers = getattr(settings, 'RECOMMENDER_PRECOMPUTE_WORKERS', 1)
+
+    executor = None
+    if workers > 1:
+        # Forked workers must not share this process' database connections
+        connections.close_all()
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=django.setup)
+
+    try:
+        data = {}
 
-def precalculate_data():
-    """Precompute course features and collaborative similarity matrix, store in shelve."""
-    with shelve.open(SHELVE_FILE) as db:
         # --- Course features ---
-        features_dict = {}
         print("Calculando features de cursos...")
-        for course in Course.objects.all():
-            features_dict[course.id] = course_features(course)
-        db['course_features'] = features_dict
-        print("Features de cursos guardadas en shelve.")
+        features_dict = compute_course_features(executor, workers)
+        data['course_features'] = features_dict
+        data['feature_index'] = FeatureIndex.from_matrix(FeatureMatrix.build(features_dict, FEATURE_WEIGHTS))
 
-        # --- Collaborative similarity matrix ---
-        print("Calculando matriz de similitud colaborativa...")
         prefs = build_prefs()
-        db['item_sim'] = calculateSimilarItems(prefs)
-        print("Matriz de similitud guardada en shelve.")
\ No newline at end of file
+
+        # --- Matrix factorization model ---
+        print("Entrenando modelo de factorización de matrices (ALS)...")
+        data['mf_model'] = train_als(prefs) if prefs else None
+
+        # --- Collaborative similarity matrix, only read by the item-based branch and without an MF model ---
+        if item_similarities_used(has_mf_model=data['mf_model'] is not None):
+            print("Calculando matriz de similitud colaborativa...")
+            data['item_sim'] = compute_similar_items(prefs, executor, workers)
+        else:
+            data['item_sim'] = {}
+
+        # Everything is written at the end, so workers reloading the store never mix old and new keys for long
+        data['version'] = time.time()
+        STORE.update(data)
+        # Neighbour lists recomputed after feedback correct older snapshots only
+        CourseNeighbours.objects.exclude(snapshot_version=data['version']).delete()
+        print("Datos guardados en shelve (versión %d)." % data['version'])
+
+        print("Actualizando tabla de popularidad...")
+        refresh_popularity()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def shard(items, n_shards):
+    """Split a list into at most n_shards contiguous, similarly sized shards."""
+    size = -(-len(items) // max(n_shards, 1))
+    return [items[i:i + size] for i in range(0, len(items), size)] if items else []
+
+
+def compute_course_features(executor=None, workers=1):
+    """Features of every course, computed in one bulk pass or sharded across the executor's workers."""
+    if executor is None:
+        return bulk_course_features()
+
+    course_ids = list(Course.objects.values_list('id', flat=True))
+    features_dict = {}
+    # One shard per worker: each shard reads the stored keywords once
+    for part in executor.map(bulk_course_features, shard(course_ids, workers)):
+        features_dict.update(part)
+    return features_dict
+
+
+def similar_items_shard(operands, course_ids, columns, n=10, block_size=1000):
+    """Neighbour lists of a shard of course columns, computed block by block."""
+    result = {}
+    for start in range(0, len(columns), block_size):
+        result.update(similar_items_block(operands, course_ids, columns[start:start + block_size], n=n))
+    return result
+
+
+def compute_similar_items(prefs, executor=None, workers=1, n=10, block_size=1000):
+    """Top-n item similarities for every course, inline or with one shard of columns per worker."""
+    ratings, _, course_ids = build_rating_matrix(prefs)
+    operands = rating_operands(ratings)
+    if executor is None:
+        return similar_items_shard(operands, course_ids, list(range(len(course_ids))), n, block_size)
+
+    # One shard per worker, so the rating matrices are sent to each process only once
+    shards = shard(list(range(len(course_ids))), workers)
+    item_sim = {}
+    for part in executor.map(similar_items_shard, repeat(operands), repeat(course_ids), shards, repeat(n), repeat(block_size)):
+        item_sim.update(part)
+    return item_sim
+
+
+def raters(course_ids, max_raters=None):
+    """Subquery of the users who rated the courses, at most the max_raters most recent ones of each course."""
+    qs = UserCourse.objects.filter(course_id__in=course_ids)
+    if max_raters:
+        qs = qs.annotate(
+            rank=Window(RowNumber(), partition_by=F('course_id'), order_by=[F('timestamp').desc(), F('id').desc()]),
+        ).filter(rank__lte=max_raters)
+    return qs.values('user_id')
+
+
+def update_item_similarities(user_ids, course_ids, n=10, max_raters=None):
+    """
+    Recompute the neighbour lists changed by the feedback of user_ids on course_ids and store them
+    in CourseNeighbours for the current snapshot, leaving the shelve untouched.
+    Only the pairs (touched course, other course rated by the user) change, so only the lists of those
+    courses are recomputed, from the ratings of (at most max_raters per course of) the users who rated them.
+    """
+    version = STORE.get('version')
+    if version is None:
+        # Nothing precomputed yet to correct
+        return
+
+    affected = set(course_ids) | set(UserCourse.objects.filter(user_id__in=user_ids).values_list('course_id', flat=True))
+    # Rows instead of model instances, which would take most of the time
+    prefs = build_prefs(
+        UserCourse.objects
+        .filter(user_id__in=raters(affected, max_raters))
+        .values_list('user_id', 'course_id', 'liked', 'disliked', 'viewed', named=True)
+    )
+    neighbours = similar_items_for(prefs, affected, n=n)
+
+    with transaction.atomic():
+        CourseNeighbours.objects.filter(course_id__in=affected).delete()
+        CourseNeighbours.objects.bulk_create([
+            CourseNeighbours(course_id=cid, neighbours=[[float(sim), other] for sim, other in scores], snapshot_version=version)
+            for cid, scores in neighbours.items()
+        ])
+
+
+class ItemSimilarityUpdater:
+    """
+    Keeps the neighbour lists touched by feedback up to date off the request path. Feedback only
+    records who changed what; RECOMMENDER_ITEM_SIM_DELAY seconds after the first change a background
+    thread recomputes every list touched meanwhile in one batch (None = recompute in the request).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = set()
+        self._courses = set()
+        self._timer = None
+        self.batches = 0
+
+    def schedule(self, user_id, course_id):
+        delay = getattr(settings, 'RECOMMENDER_ITEM_SIM_DELAY', ITEM_SIM_DELAY)
+        with self._lock:
+            self._users.add(user_id)
+            self._courses.add(course_id)
+            if delay is not None and self._timer is None:
+                self._timer = threading.Timer(delay, self._run)
+                self._timer.daemon = True
+                self._timer.start()
+        if delay is None:
+            self.flush()
+
+    def _run(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Item similarity update error: {e}")
+        finally:
+            # The timer thread must not keep database connections open
+            connections.close_all()
+
+    def flush(self):
+        """Recompute the pending neighbour lists now."""
+        with self._lock:
+            users, courses = self._users, self._courses
+            self._users, self._courses = set(), set()
+        if not courses:
+            return
+        max_raters = getattr(settings, 'RECOMMENDER_MAX_RATERS_PER_COURSE', MAX_RATERS_PER_COURSE)
+        update_item_similarities(users, courses, max_raters=max_raters)
+        self.batches += 1
+
+
+ITEM_SIMILARITIES = ItemSimilarityUpdater()
+
+
+def feedback_changed(user_id, course_id):
+    """Propagate a change in a user's interaction with a course to the precomputed recommender data."""
+    if item_similarities_used():
+        ITEM_SIMILARITIES.schedule(user_id, course_id)
+    update_user_profile(user_id, course_id)
+    invalidate_user_recommendations(user_id)
+    update_course_popularity(course_id)
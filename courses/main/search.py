@@ -0,0 +1,409 @@
+import os
+import threading
+from contextlib import contextmanager
+
+from whoosh import sorting
+from whoosh.qparser import MultifieldParser, OrGroup
+from whoosh.query import Term, And, Or, Not, AndNot, Every, NumericRange
+
+from .models import Course, Platform, Category, Instructor
+from .populateDB import open_whoosh, whoosh_index_dir
+from .search_cache import catalog_version
+
+class SearcherManager:
+    """
+    Process-wide Whoosh index and searchers, shared by every request.
+    Each index directory is opened once. Every thread keeps its own searcher (searchers are not meant to be
+    shared between threads) and reuses it across requests, refreshing it only when a commit such as
+    index_courses produced a new generation of the index.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._indexes = {}
+        self._local = threading.local()
+        self.opens = 0
+        self.refreshes = 0
+
+    def _check_process(self):
+        # Forked workers must not share the parent's open index files
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+
+    def index(self, index_dir=None):
+        """The open index of index_dir (by default the configured one)."""
+        self._check_process()
+        index_dir = index_dir or whoosh_index_dir()
+        ix = self._indexes.get(index_dir)
+        if ix is None:
+            with self._lock:
+                ix = self._indexes.get(index_dir)
+                if ix is None:
+                    ix = self._indexes[index_dir] = open_whoosh(index_dir)
+        return ix
+
+    @contextmanager
+    def searcher(self, index_dir=None):
+        """
+        Up-to-date searcher of the current thread, used like ix.searcher() but not closed on exit.
+        Checking whether the index has a new generation only lists the index directory.
+        """
+        index_dir = index_dir or whoosh_index_dir()
+        ix = self.index(index_dir)
+        searchers = self._local.__dict__.setdefault('searchers', {})
+        searcher = searchers.get(index_dir)
+
+        if searcher is None:
+            searcher = ix.searcher()
+            self.opens += 1
+        else:
+            try:
+                fresh = searcher.refresh()
+            except Exception:
+                # The index was removed or rebuilt from scratch: open it again
+                fresh = self.reopen(index_dir).searcher()
+            if fresh is not searcher:
+                # refresh() reuses the unchanged segments and releases the old searcher itself
+                self.refreshes += 1
+                searcher = fresh
+
+        searchers[index_dir] = searcher
+        yield searcher
+
+    def reopen(self, index_dir):
+        with self._lock:
+            ix = self._indexes[index_dir] = open_whoosh(index_dir)
+        return ix
+
+    def stats(self):
+        return {'indexes': len(self._indexes), 'opens': self.opens, 'refreshes': self.refreshes}
+
+
+SEARCHERS = SearcherManager()
+
+
+# Names saved in the database for courses scraped without platform or category (see save_courses_dB);
+# the index keeps those fields empty
+DEFAULT_NAMES = {
+    'platform': 'Unknown',
+    'category': 'General',
+}
+
+# Whoosh equivalents of the duration and rating filters of all_courses
+DURATION_RANGES = {
+    '<5': NumericRange('duration', None, 5.0, endexcl=True),
+    '5-10': NumericRange('duration', 5.0, 10.0),
+    '10-50': NumericRange('duration', 10.0, 50.0, startexcl=True),
+    '>50': NumericRange('duration', 50.0, None, startexcl=True),
+}
+RATING_RANGES = {
+    '<3': NumericRange('rating', None, 3.0, endexcl=True),
+    '3-4': NumericRange('rating', 3.0, 4.0, endexcl=True),
+    '4-4.5': NumericRange('rating', 4.0, 4.5, endexcl=True),
+    '>4.5': NumericRange('rating', 4.5, None),
+}
+
+
+def field_tokens(schema, field, text):
+    """Terms the index stores for text in a KEYWORD field."""
+    return frozenset(schema[field].process_text(text, mode='query'))
+
+
+def name_filter(schema, field, name, all_names):
+    """
+    Query matching the documents whose KEYWORD field holds exactly name.
+    Names are split into words by the index, so the query requires all of its words and excludes the
+    other names made of the same words plus some more. Returns None when another name has exactly
+    the same words, which the index cannot tell apart.
+    """
+    tokens = field_tokens(schema, field, name)
+    if not tokens:
+        return Not(Every(field))
+
+    supersets = []
+    for other in all_names:
+        if other == name:
+            continue
+        other_tokens = field_tokens(schema, field, other)
+        if other_tokens == tokens:
+            return None
+        if other_tokens > tokens:
+            supersets.append(And([Term(field, t) for t in sorted(other_tokens)]))
+
+    query = And([Term(field, t) for t in sorted(tokens)])
+    if supersets:
+        query = AndNot(query, Or(supersets))
+    if name == DEFAULT_NAMES.get(field):
+        query = Or([query, Not(Every(field))])
+    return query
+
+
+def model_filter(schema, field, model, value):
+    """Filter for the id of a Platform, Category or Instructor given in the request, or None if it cannot be expressed."""
+    names = list(model.objects.values_list('name', flat=True))
+    name = model.objects.filter(id=int(value)).values_list('name', flat=True).first()
+    if name is None:
+        # Unknown id: nothing matches, like the SQL filter
+        return Not(Every())
+    return name_filter(schema, field, name, names)
+
+
+def catalog_filters(schema, platform_id='', category_id='', level='', instructor_id='', duration='', rating=''):
+    """
+    ({filter name: Whoosh query} of the catalog filters of all_courses that are set, True), to be combined
+    with And, or ({}, False) if some filter can only be applied in the database (e.g. courses without
+    category, which the index cannot tell from 'General').
+    """
+    filters = {}
+
+    if platform_id and platform_id.isdigit():
+        filters['platform'] = model_filter(schema, 'platform', Platform, platform_id)
+    if category_id:
+        if category_id == 'none':
+            return {}, False
+        if category_id.isdigit():
+            filters['category'] = model_filter(schema, 'category', Category, category_id)
+    if level:
+        levels = set(Course.objects.values_list('level', flat=True).distinct())
+        filters['level'] = name_filter(schema, 'level', level, levels) if level in levels else Not(Every())
+    if instructor_id:
+        if instructor_id == 'none':
+            filters['instructor'] = Not(Every('instructor'))
+        elif instructor_id.isdigit():
+            filters['instructor'] = model_filter(schema, 'instructor', Instructor, instructor_id)
+    if duration in DURATION_RANGES:
+        if not duration_ranges_supported(schema):
+            return {}, False
+        filters['duration'] = DURATION_RANGES[duration]
+    if rating in RATING_RANGES:
+        filters['rating'] = RATING_RANGES[rating]
+
+    if any(f is None for f in filters.values()):
+        return {}, False
+    return filters, True
+
+
+def duration_ranges_supported(schema):
+    """Indexes built before duration was a signed float field answer ranges wrongly (unsigned ints, truncated hours)."""
+    field = schema['duration']
+    return field.numtype is float and field.signed
+
+
+def catalog_facets(schema, platforms, categories):
+    """
+    Whoosh groupings counting the hits of a search per option of the catalog filters.
+    Platforms and categories are grouped by the id of the given objects (names split into words are
+    matched as in name_filter), levels by the term of the level field and durations and ratings by the
+    same ranges as their filters.
+    """
+    facets = sorting.Facets()
+    for field, objects in (('platform', platforms), ('category', categories)):
+        names = [obj.name for obj in objects]
+        queries = {}
+        for obj in objects:
+            query = name_filter(schema, field, obj.name, names)
+            if query is not None:
+                queries[str(obj.id)] = query
+        facets.add_facet(field, sorting.QueryFacet(queries, maptype=sorting.Count))
+    facets.add_facet('level', sorting.FieldFacet('level', maptype=sorting.Count))
+    if duration_ranges_supported(schema):
+        facets.add_facet('duration', sorting.QueryFacet(DURATION_RANGES, maptype=sorting.Count))
+    facets.add_facet('rating', sorting.QueryFacet(RATING_RANGES, maptype=sorting.Count))
+    return facets
+
+
+def facet_options(searcher, facet):
+    """{key: query} of the options of a facet of catalog_facets."""
+    if isinstance(facet, sorting.QueryFacet):
+        return facet.querydict
+    return {text: Term(facet.fieldname, text) for text in searcher.reader().field_terms(facet.fieldname)}
+
+
+def disjunctive_facet_counts(searcher, query, filters, facets, counts):
+    """
+    Facet counts of a search where the options of every facet with a filter of its own count the hits of
+    query under the other filters only, i.e. the hits choosing that option instead would give. counts are
+    the groupings of the filtered search, kept for the facets without a filter.
+    """
+    own = [name for name in facets.names() if name in filters]
+    if not own:
+        return counts
+
+    matched = set(searcher.docs_for_query(query))
+    filtered = {name: set(searcher.docs_for_query(f)) for name, f in filters.items()}
+    counts = dict(counts)
+    for name in own:
+        docs = matched.intersection(*(d for other, d in filtered.items() if other != name))
+        counts[name] = {}
+        for key, option in facet_options(searcher, facets.facets[name]).items():
+            count = len(docs.intersection(searcher.docs_for_query(option))) if docs else 0
+            if count:
+                counts[name][key] = count
+    return counts
+
+
+class SearchResults:
+    """
+    Lazy sequence of the courses matching a Whoosh query, for Django's Paginator.
+    The total comes from the index and slicing a page runs search_page for it, so only the
+    courses of the requested page are loaded from the database. Must be used while the searcher is open.
+    groupedby (e.g. catalog_facets) is computed by the same search_page call, see facet_counts.
+    """
+
+    def __init__(self, searcher, query, filter=None, pagelen=10, groupedby=None):
+        self.searcher = searcher
+        self.query = query
+        self.groupedby = groupedby
+        # Whoosh ignores a filter that matches no document, so the matching documents are resolved here
+        self.filter = set(searcher.docs_for_query(filter)) if filter is not None else None
+        self.pagelen = pagelen
+        self.stored = stored_results_schema(searcher.schema)
+        self._pages = {}
+
+    def page(self, pagenum):
+        """Whoosh ResultsPage of the given page number, searched once."""
+        if self.filter is not None and not self.filter:
+            return []
+        if pagenum not in self._pages:
+            self._pages[pagenum] = self.searcher.search_page(
+                self.query, pagenum, pagelen=self.pagelen, filter=self.filter, groupedby=self.groupedby,
+            )
+        return self._pages[pagenum]
+
+    def facet_counts(self):
+        """{facet name: {key: hits}} of the groupings, taken from any page already searched."""
+        if self.groupedby is None:
+            return {}
+        if self.filter is not None and not self.filter:
+            return {name: {} for name in self.groupedby.names()}
+        page = next(iter(self._pages.values()), None) or self.page(1)
+        return {name: page.results.groups(name) for name in self.groupedby.names()}
+
+    def ranking(self):
+        """Cacheable summary of the search: first page of (url, score) hits, total hits and facet counts."""
+        return {
+            'hits': self.hits(0, min(self.pagelen, len(self))),
+            'total': len(self),
+            'facets': self.facet_counts(),
+            'field_name': self.field_name,
+        }
+
+    def __len__(self):
+        return len(self.page(1))
+
+    @property
+    def field_name(self):
+        """Course field the keys of hits() refer to, or None when they are the stored fields of the hits."""
+        return None if self.stored else 'url'
+
+    def hits(self, start, stop):
+        """(url or stored fields, score) of the hits ranked from start to stop, which must fall within a page."""
+        page = self.page(start // self.pagelen + 1)
+        offset = (start // self.pagelen) * self.pagelen
+        return [(hit.fields() if self.stored else hit['url'], hit.score) for hit in page][start - offset:stop - offset]
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+
+        start = index.start or 0
+        stop = len(self) if index.stop is None else min(index.stop, len(self))
+        if stop <= start:
+            return []
+        # Paginator slices whole pages of pagelen courses
+        return load_courses(self.hits(start, stop), self.field_name)
+
+
+class RankedResults:
+    """
+    Sequence of courses over a ranking already computed, [(course key, score)] of the total hits,
+    for Django's Paginator. Keys are values of field_name, or stored fields of index hits if it is None.
+    Ranks past the end of the ranking (when it was truncated) are asked to more(start, stop).
+    """
+
+    def __init__(self, hits, total=None, field_name='url', more=None):
+        self.hits = hits
+        self.total = len(hits) if total is None else total
+        self.field_name = field_name
+        self.more = more
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+
+        start = index.start or 0
+        stop = self.total if index.stop is None else min(index.stop, self.total)
+        if stop <= start:
+            return []
+        if stop > len(self.hits) and self.more is not None:
+            return load_courses(self.more(start, stop), self.field_name)
+        return load_courses(self.hits[start:stop], self.field_name)
+
+
+class IndexedCourse:
+    """Course of a search result rendered from the fields stored in the index, see course_schema(stored_results=True)."""
+
+    def __init__(self, fields, score):
+        self.id = self.pk = fields['course_id']
+        self.url = fields['url']
+        self.title = fields.get('title', '')
+        # Empty fields are saved with the default name in the database, see save_courses_dB
+        self.platform = fields.get('platform') or DEFAULT_NAMES['platform']
+        self.level = fields.get('level', '')
+        self.instructor = fields.get('instructor') or None
+        self.duration = fields.get('duration')
+        self.rating = fields.get('rating')
+        self.description = fields.get('summary', '')
+        self.search_score = score
+
+
+def stored_results_schema(schema):
+    """Whether the index stores what search result pages show (built with WHOOSH_STORED_RESULTS)."""
+    return 'course_id' in schema and schema['title'].stored
+
+
+def load_courses(hits, field_name='url'):
+    """
+    Courses of the (key, score) hits in their order, with search_score set, in a single query,
+    or without any if field_name is None and the keys are the stored fields of the hits.
+    """
+    if field_name is None:
+        # Documents indexed before their course was saved have no id and no page to link to
+        return [IndexedCourse(fields, score) for fields, score in hits if fields.get('course_id') is not None]
+
+    courses = Course.objects.select_related('platform', 'instructor').in_bulk([key for key, _ in hits], field_name=field_name)
+    result = []
+    for key, score in hits:
+        course = courses.get(key)
+        if course is not None:
+            course.search_score = score
+            result.append(course)
+    return result
+
+
+def index_version(searcher):
+    """Version of the catalog searched: index directory and generation of the searcher and database catalog version."""
+    return whoosh_index_dir(), searcher.ixreader.generation(), catalog_version()
+
+
+# Fields of catalog searches and their weights (shared by every search backend)
+SEARCH_FIELD_WEIGHTS = {
+    'title': 2.0,
+    'keywords': 1.5,
+    'description': 1.0,
+}
+
+
+def course_search_query(schema, text):
+    """Parse a catalog search: any of the words, in title, keywords and description (by decreasing weight)."""
+    parser = MultifieldParser(['title', 'description', 'keywords'], schema=schema, group=OrGroup, fieldboosts=SEARCH_FIELD_WEIGHTS)
+    return parser.parse(text)
@@ -0,0 +1,339 @@
+import re
+from abc import ABC, abstractmethod
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from whoosh.query import Term, And, Or, NumericRange, NullQuery
+
+from .models import Course, Instructor
+from .populateDB import index_courses, open_whoosh
+from .recommender_content import parse_keywords, stored_keywords
+from .search import SEARCHERS, SEARCH_FIELD_WEIGHTS, DEFAULT_NAMES, course_search_query, field_tokens, index_version
+from .search_cache import bump_search_version, search_versions
+
+# Clauses of filters and similarity searches, the same for every backend:
+# a field holding a value (a single keyword for 'keywords') or a numeric field within a range
+FieldTerm = namedtuple('FieldTerm', 'field value boost', defaults=(1.0,))
+FieldRange = namedtuple('FieldRange', 'field low high boost low_inclusive high_inclusive', defaults=(None, None, 1.0, True, True))
+
+# A search result: url of the course, score and its keywords
+Hit = namedtuple('Hit', 'url score keywords')
+
+# Clauses of the duration and rating filters of all_courses (see search.DURATION_RANGES)
+DURATION_CLAUSES = {
+    '<5': FieldRange('duration', None, 5.0, high_inclusive=False),
+    '5-10': FieldRange('duration', 5.0, 10.0),
+    '10-50': FieldRange('duration', 10.0, 50.0, low_inclusive=False),
+    '>50': FieldRange('duration', 50.0, None, low_inclusive=False),
+}
+RATING_CLAUSES = {
+    '<3': FieldRange('rating', None, 3.0, high_inclusive=False),
+    '3-4': FieldRange('rating', 3.0, 4.0, high_inclusive=False),
+    '4-4.5': FieldRange('rating', 4.0, 4.5, high_inclusive=False),
+    '>4.5': FieldRange('rating', 4.5, None),
+}
+
+
+def catalog_clauses(platforms, categories, platform_id, category_id, level, instructor_id, duration, rating):
+    """
+    (clauses, expressible): the catalog filters of all_courses as backend clauses, matching names like
+    the foreign keys of the database. Filters on missing categories or instructors ('none') are not expressible.
+    """
+    clauses = []
+    if platform_id and platform_id.isdigit():
+        name = {p.id: p.name for p in platforms}.get(int(platform_id))
+        if name is None:
+            return [], False
+        clauses.append(FieldTerm('platform', name))
+    if category_id:
+        name = {str(c.id): c.name for c in categories}.get(category_id)
+        if name is None:
+            return [], False
+        clauses.append(FieldTerm('category', name))
+    if level:
+        clauses.append(FieldTerm('level', level))
+    if instructor_id:
+        name = Instructor.objects.filter(id=instructor_id).values_list('name', flat=True).first() if instructor_id.isdigit() else None
+        if name is None:
+            return [], False
+        clauses.append(FieldTerm('instructor', name))
+    if duration in DURATION_CLAUSES:
+        clauses.append(DURATION_CLAUSES[duration])
+    if rating in RATING_CLAUSES:
+        clauses.append(RATING_CLAUSES[rating])
+    return clauses, True
+
+
+def catalog_courses():
+    """
+    The courses of the database as the dicts given to index_courses, with the keywords stored in the
+    Whoosh index (they are extracted when scraping and not saved in the database).
+    """
+    keywords = stored_keywords()
+    courses = Course.objects.select_related('platform', 'category', 'instructor').order_by('id')
+    return [
+        {
+            "url": course.url, "title": course.title, "description": course.description,
+            "platform": course.platform.name, "category": course.category.name if course.category else None,
+            "level": course.level, "instructor": course.instructor.name if course.instructor else None,
+            "duration": course.duration, "rating": course.rating, "last_scraped": course.last_scraped,
+            "keywords": keywords.get(course.url, []),
+        }
+        for course in courses
+    ]
+
+
+class SearchBackend(ABC):
+    """Full-text index of the courses with the operations the views need. Subclasses implement them."""
+    name = None
+
+    @abstractmethod
+    def index_courses(self, courses):
+        """Add or replace scraped courses, dicts like the ones given to populateDB.index_courses."""
+
+    @abstractmethod
+    def version(self):
+        """Hashable version of the indexed catalog, changed when courses are indexed or saved (see search_cache)."""
+
+    @abstractmethod
+    def search(self, text, filters=(), limit=10, offset=0):
+        """
+        ([Hit], total hits) of the courses with any word of text in their title, keywords or description
+        (weighted by SEARCH_FIELD_WEIGHTS) matching every filter clause, by decreasing relevance.
+        The hits are limit of them (all if None) from rank offset on; the total counts every match.
+        """
+
+    @abstractmethod
+    def match_any(self, clauses, limit=10):
+        """[Hit] of the courses matching some of the clauses, the ones matching more and heavier clauses first."""
+
+    @abstractmethod
+    def lookup(self, url):
+        """Hit (score None) of the indexed course with this url, or None."""
+
+
+class WhooshBackend(SearchBackend):
+    """The Whoosh index of populateDB, searched through the shared searchers of SEARCHERS."""
+    name = 'whoosh'
+
+    def index_courses(self, courses):
+        index_courses(courses, open_whoosh())
+
+    def version(self):
+        with SEARCHERS.searcher() as searcher:
+            return index_version(searcher)
+
+    @staticmethod
+    def clause_query(schema, clause):
+        if isinstance(clause, FieldRange):
+            return NumericRange(
+                clause.field, clause.low, clause.high, boost=clause.boost,
+                startexcl=not clause.low_inclusive, endexcl=not clause.high_inclusive,
+            )
+        # Names are split into words by the index (see search.name_filter)
+        terms = [Term(clause.field, token) for token in sorted(field_tokens(schema, clause.field, clause.value))]
+        if not terms:
+            return NullQuery
+        if len(terms) == 1:
+            return Term(clause.field, terms[0].text, boost=clause.boost)
+        return And(terms, boost=clause.boost)
+
+    @staticmethod
+    def hits(results):
+        return [Hit(hit['url'], hit.score, parse_keywords(hit.get('keywords'))) for hit in results]
+
+    def search(self, text, filters=(), limit=10, offset=0):
+        with SEARCHERS.searcher() as searcher:
+            schema = searcher.schema
+            allowed = None
+            if filters:
+                # Whoosh ignores a filter that matches no document, so the matching documents are resolved here
+                allowed = set(searcher.docs_for_query(And([self.clause_query(schema, c) for c in filters])))
+                if not allowed:
+                    return [], 0
+            results = searcher.search(
+                course_search_query(schema, text), limit=None if limit is None else offset + limit, filter=allowed,
+            )
+            return self.hits(results[offset:]), len(results)
+
+    def match_any(self, clauses, limit=10):
+        with SEARCHERS.searcher() as searcher:
+            query = Or([self.clause_query(searcher.schema, c) for c in clauses])
+            return self.hits(searcher.search(query, limit=limit))
+
+    def lookup(self, url):
+        with SEARCHERS.searcher() as searcher:
+            fields = searcher.document(url=url)
+        if fields is None:
+            return None
+        return Hit(fields['url'], None, parse_keywords(fields.get('keywords')))
+
+
+class Fts5Backend(SearchBackend):
+    """
+    The courses in an SQLite FTS5 virtual table of the project database (see migrations 0008_course_fts
+    and 0011_course_fts_name_columns). Searches match title, description and keywords, ranked by bm25
+    with SEARCH_FIELD_WEIGHTS; the names of platform, category, level and instructor are full-text columns
+    too, matched by match_any. Duration and rating are stored unindexed and filtered in SQL. Rows use the
+    course id as rowid, so courses must be saved before they are indexed and urls are looked up through
+    the index of main_course.
+    """
+    name = 'sqlite_fts5'
+    table = 'main_course_fts'
+    columns = ('url', 'title', 'description', 'keywords', 'platform', 'category', 'level', 'instructor', 'duration', 'rating')
+    text_columns = ('title', 'description', 'keywords')
+
+    def __init__(self):
+        # The table is created by migration 0008_course_fts on SQLite databases only
+        if connection.vendor != 'sqlite':
+            raise ImproperlyConfigured("The sqlite_fts5 search backend needs an SQLite database")
+
+    def index_courses(self, courses):
+        course_ids = dict(Course.objects.values_list('url', 'id'))
+        rows = []
+        for course in courses:
+            course_id = course_ids.get(course["url"])
+            if course_id is None:
+                continue
+            rows.append((
+                course_id, course["url"], course["title"] or "", course["description"] or "",
+                ",".join(parse_keywords(",".join(course["keywords"] or []))),
+                # Missing names are saved with the default ones in the database, see save_courses_dB
+                course["platform"] or DEFAULT_NAMES['platform'], course["category"] or DEFAULT_NAMES['category'],
+                course["level"] or "", course["instructor"] or "",
+                course["duration"] or None, course["rating"] or None,
+            ))
+
+        placeholders = ', '.join(['%s'] * (len(self.columns) + 1))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (rowid, {', '.join(self.columns)}) VALUES ({placeholders})", rows,
+            )
+        bump_search_version(self.name)
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+        bump_search_version(self.name)
+
+    def version(self):
+        # Generation of the table and version of the catalog, in one query
+        versions = search_versions()
+        return self.name, connection.settings_dict['NAME'], versions.get(self.name, 0), versions.get('catalog', 0)
+
+    def clause_sql(self, clause):
+        """(SQL condition, params) of a clause."""
+        if clause.field not in self.columns:
+            raise ValueError(f"Unknown search field {clause.field!r}")
+        if isinstance(clause, FieldRange):
+            conditions, params = [], []
+            if clause.low is not None:
+                conditions.append(f"{clause.field} {'>=' if clause.low_inclusive else '>'} %s")
+                params.append(clause.low)
+            if clause.high is not None:
+                conditions.append(f"{clause.field} {'<=' if clause.high_inclusive else '<'} %s")
+                params.append(clause.high)
+            return f"({' AND '.join(conditions) or f'{clause.field} IS NOT NULL'})", params
+        if clause.field == 'keywords':
+            return "instr(',' || keywords || ',', ',' || %s || ',') > 0", [clause.value.strip().lower()]
+        return f"lower({clause.field}) = lower(%s)", [clause.value]
+
+    def match_expression(self, text):
+        """FTS5 query matching any word of text in the searched columns, like the OrGroup of course_search_query."""
+        words = re.findall(r'\w+', text.lower())
+        if not words:
+            return ''
+        phrases = ' OR '.join(f'"{word}"' for word in dict.fromkeys(words))
+        return f"{{{' '.join(self.text_columns)}}} : ({phrases})"
+
+    @staticmethod
+    def phrase(value):
+        """FTS5 phrase of the words of value, or '' if it has none."""
+        words = re.findall(r'\w+', (value or '').lower())
+        return f'"{" ".join(words)}"' if words else ''
+
+    def search(self, text, filters=(), limit=10, offset=0):
+        expression = self.match_expression(text)
+        if not expression:
+            return [], 0
+
+        weights = ', '.join(str(SEARCH_FIELD_WEIGHTS.get(c, 0.0)) for c in self.columns)
+        conditions, params = [f"{self.table} MATCH %s"], [expression]
+        for clause in filters:
+            condition, clause_params = self.clause_sql(clause)
+            conditions.append(condition)
+            params.extend(clause_params)
+
+        with connection.cursor() as cursor:
+            # bm25 is lower for better matches and cannot be used next to a window function
+            cursor.execute(
+                f"SELECT url, score, keywords, count(*) OVER () FROM ("
+                f"SELECT url, keywords, -bm25({self.table}, {weights}) AS score FROM {self.table} "
+                f"WHERE {' AND '.join(conditions)}) ORDER BY score DESC, rowid LIMIT %s OFFSET %s",
+                params + [-1 if limit is None else limit, offset],
+            )
+            rows = cursor.fetchall()
+        if not rows and offset:
+            # Past the last hit the window function has no row to report the total on
+            return [], self.search(text, filters, limit=1)[1]
+        total = rows[0][3] if rows else 0
+        return [Hit(url, score, parse_keywords(keywords)) for url, score, keywords, _ in rows], total
+
+    def match_any(self, clauses, limit=10):
+        """
+        The terms are matched through the full-text index and ranked by bm25, each column weighted by the
+        heaviest boost of its terms; the boosts of the clauses a matched course meets exactly (ranges
+        included) are added to re-rank them. Courses meeting only range clauses are not matched.
+        """
+        phrases, weights = [], {}
+        for clause in clauses:
+            if isinstance(clause, FieldTerm) and self.phrase(clause.value):
+                if clause.field not in self.columns:
+                    raise ValueError(f"Unknown search field {clause.field!r}")
+                phrases.append(f"{clause.field} : {self.phrase(clause.value)}")
+                weights[clause.field] = max(weights.get(clause.field, 0.0), float(clause.boost))
+        if not phrases:
+            return []
+
+        boosts, params = [], []
+        for clause in clauses:
+            condition, clause_params = self.clause_sql(clause)
+            boosts.append(f"CASE WHEN {condition} THEN {float(clause.boost)} ELSE 0 END")
+            params.extend(clause_params)
+        column_weights = ', '.join(str(weights.get(c, 0.0)) for c in self.columns)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT url, {' + '.join(boosts)} - bm25({self.table}, {column_weights}) AS score, keywords "
+                f"FROM {self.table} WHERE {self.table} MATCH %s ORDER BY score DESC, rowid LIMIT %s",
+                params + [' OR '.join(dict.fromkeys(phrases)), limit],
+            )
+            return [Hit(url, score, parse_keywords(keywords)) for url, score, keywords in cursor.fetchall()]
+
+    def lookup(self, url):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT url, keywords FROM {self.table} WHERE rowid = (SELECT id FROM main_course WHERE url = %s)", [url],
+            )
+            row = cursor.fetchone()
+        return Hit(row[0], None, parse_keywords(row[1])) if row else None
+
+
+BACKENDS = {
+    WhooshBackend.name: WhooshBackend,
+    Fts5Backend.name: Fts5Backend,
+}
+
+_instances = {}
+
+
+def search_backend(name=None):
+    """The search backend called name, by default the one of settings.SEARCH_BACKEND."""
+    name = name or getattr(settings, 'SEARCH_BACKEND', WhooshBackend.name)
+    if name not in _instances:
+        if name not in BACKENDS:
+            raise ImproperlyConfigured(f"Unknown search backend {name!r}, use one of {sorted(BACKENDS)}")
+        _instances[name] = BACKENDS[name]()
+    return _instances[name]
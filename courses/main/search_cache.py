@@ -0,0 +1,119 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import F
+
+from .models import SearchVersion
+
+DEFAULT_SIZE = 500
+
+# Longest ranking kept per search; deeper pages are searched again (a multiple of the page size)
+MAX_CACHED_HITS = 100
+
+# Operators of the query parser, which are case sensitive
+QUERY_OPERATORS = {'AND', 'OR', 'NOT', 'ANDNOT', 'ANDMAYBE', 'TO'}
+
+
+def normalize_query(text):
+    """Search text with single spaces and lowercase words (analyzers lowercase them anyway), keeping operators."""
+    return ' '.join(word if word in QUERY_OPERATORS else word.lower() for word in (text or '').split())
+
+
+def search_versions():
+    """
+    {name: counter} of the shared search state, read from the database in one query so that a change
+    made by any worker (a catalog saved, an index written) invalidates the search caches of all of them.
+    """
+    return dict(SearchVersion.objects.values_list('name', 'value'))
+
+
+def bump_search_version(name):
+    """Increment the counter called name."""
+    if not SearchVersion.objects.filter(name=name).update(value=F('value') + 1):
+        _, created = SearchVersion.objects.get_or_create(name=name, defaults={'value': 1})
+        if not created:
+            SearchVersion.objects.filter(name=name).update(value=F('value') + 1)
+
+
+def catalog_version():
+    """Version of the course catalog in the database, changed by save_courses_dB (see bump_catalog_version)."""
+    return search_versions().get('catalog', 0)
+
+
+def bump_catalog_version():
+    bump_search_version('catalog')
+
+
+class QueryResultCache:
+    """
+    Least recently used rankings of catalog searches in this process.
+    Entries belong to a version (index directory, index generation, catalog version): looking up a
+    newer version drops everything cached before, so a commit of index_courses or a catalog saved by
+    save_courses_dB invalidates the cache. Hits, misses and evictions are counted to size it.
+    """
+
+    def __init__(self, size=None):
+        self._size = size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def size(self):
+        if self._size is not None:
+            return self._size
+        return getattr(settings, 'SEARCH_CACHE_SIZE', DEFAULT_SIZE)
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, version, key):
+        """Cached value of key, or None."""
+        with self._lock:
+            self._check_version(version)
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, version, key, value):
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'size': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+
+SEARCH_RESULTS = QueryResultCache()
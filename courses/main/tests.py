@@ -1,3 +1,642 @@
-from django.test import TestCase
+import contextlib
+import io
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .autocomplete import AUTOCOMPLETE
+from .instrumentation import track
+from .models import Platform, Category, Instructor, Course, UserCourse, UserProfile, SearchVersion
+from .populateDB import init_whoosh, index_courses, save_courses_dB
+from .recommender import recommend_hybrid_report
+from .recommender_cache import cached_recommend_hybrid, invalidate_user_recommendations, user_generation
+from .recommender_batch import generate_batch_recommendations, stored_recommendations
+from .recommender_colab import recommend_collaborative, recommend_item_based, recommend_user_based
+from .recommender_colab import build_prefs, item_neighbours, calculateSimilarItems
+from .recommender_content import normalize_profile, rebuild_user_profile, stored_user_profile
+from .recommender_matrix import calculate_similar_items_sparse
+from .recommender_store import STORE, PrecomputedStore
+from .recommender_utils import precalculate_data, compute_similar_items
+from .search_backends import search_backend, FieldTerm, FieldRange
+from .search_cache import SEARCH_RESULTS
+
+
+class QueryBudgetMixin:
+    """
+    Catalog of courses in the database and in a temporary Whoosh index, with a user who
+    interacted with some of them. Views are checked against settings.VIEW_QUERY_BUDGETS.
+    """
+    n_courses = 30
+    stored_results = False
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.overrides = override_settings(
+            WHOOSH_INDEX_DIR=f"{cls.tmp}/whoosh_index",
+            WHOOSH_STORED_RESULTS=cls.stored_results,
+            RECOMMENDER_SHELVE_FILE=f"{cls.tmp}/precomputed",
+        )
+        cls.overrides.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.overrides.disable()
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+
+    @classmethod
+    def create_catalog(cls):
+        platforms = [Platform.objects.create(name=name) for name in ("Coursera", "edX")]
+        categories = [Category.objects.create(name=name) for name in ("Data Science", "Programming")]
+        instructors = [Instructor.objects.create(name=name) for name in ("Ana López", "John Smith")]
+        now = timezone.now()
+
+        docs = []
+        for i in range(cls.n_courses):
+            course = Course.objects.create(
+                title=f"Python course {i}", description="Learn python programming", url=f"https://example.com/{i}",
+                platform=platforms[i % 2], category=categories[i % 2], instructor=instructors[i % 2],
+                level=["Beginner", "Intermediate", "Advanced"][i % 3], duration=float(i % 12), rating=3.0 + (i % 5) / 2,
+                last_scraped=now,
+            )
+            docs.append({
+                "url": course.url, "title": course.title, "description": course.description,
+                "platform": course.platform.name, "level": course.level, "category": course.category.name,
+                "instructor": course.instructor.name, "duration": course.duration, "rating": course.rating,
+                "last_scraped": now, "keywords": ["python", f"topic{i % 4}"],
+            })
+        index_courses(docs, init_whoosh())
+        cls.docs = docs
+
+        cls.user = User.objects.create_user("student", password="secret")
+        for i, course in enumerate(Course.objects.all()[:8]):
+            UserCourse.objects.create(user=cls.user, course=course, liked=i % 2 == 0, viewed=1)
+
+    def setUp(self):
+        caches['recommendations'].clear()
+        SEARCH_RESULTS.clear()
+
+    def assertWithinBudget(self, url_name, response):
+        """The response was served within the SQL and Whoosh budgets of its view."""
+        self.assertEqual(response.status_code, 200)
+        max_sql, max_whoosh = settings.VIEW_QUERY_BUDGETS[url_name]
+        sql, whoosh = int(response['X-SQL-Queries']), int(response['X-Whoosh-Searches'])
+        self.assertLessEqual(sql, max_sql, f"{url_name}: {sql} consultas SQL (máx. {max_sql})")
+        self.assertLessEqual(whoosh, max_whoosh, f"{url_name}: {whoosh} búsquedas Whoosh (máx. {max_whoosh})")
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog()
+
+
+class AllCoursesBudgetTests(QueryBudgetTestCase):
+
+    def test_catalog_anonymous(self):
+        self.assertWithinBudget('all_courses', self.client.get(reverse('all_courses')))
+
+    def test_catalog_with_feedback_flags(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('all_courses'))
+        self.assertWithinBudget('all_courses', response)
+        self.assertTrue(any(c.is_liked for c in response.context['courses']))
+
+    def test_search(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('all_courses'), {'q': 'python', 'page': 2})
+        self.assertWithinBudget('all_courses', response)
+        self.assertEqual(len(response.context['courses'].object_list), 10)
+
+    def test_search_with_filters(self):
+        platform = Platform.objects.get(name="edX")
+        response = self.client.get(reverse('all_courses'), {'q': 'python', 'platform': platform.id, 'level': 'Advanced'})
+        self.assertWithinBudget('all_courses', response)
+        self.assertTrue(all(str(c.platform) == platform.name and c.level == 'Advanced' for c in response.context['courses']))
+
+    def test_search_facet_counts(self):
+        platform = Platform.objects.get(name="edX")
+        response = self.client.get(reverse('all_courses'), {'q': 'python', 'platform': platform.id})
+        self.assertWithinBudget('all_courses', response)
+        # The platform filter does not count itself: every platform shows the hits choosing it would give
+        counts = {p.name: p.facet_count for p in response.context['platforms']}
+        self.assertEqual(counts, {"Coursera": self.n_courses // 2, "edX": self.n_courses // 2})
+        levels = dict(response.context['levels'])
+        self.assertEqual(levels, {
+            lv: Course.objects.filter(platform=platform, level=lv).count() for lv in levels
+        })
+        self.assertEqual(sum(count for _, _, count in response.context['ratings']), self.n_courses // 2)
+        self.assertContains(response, "edX (15)")
+
+    def test_search_facet_counts_with_several_filters(self):
+        platform = Platform.objects.get(name="edX")
+        response = self.client.get(reverse('all_courses'), {'q': 'python', 'platform': platform.id, 'level': 'Advanced'})
+        self.assertWithinBudget('all_courses', response)
+        counts = {p.name: p.facet_count for p in response.context['platforms']}
+        self.assertEqual(counts, {p.name: Course.objects.filter(platform=p, level='Advanced').count() for p in Platform.objects.all()})
+        levels = dict(response.context['levels'])
+        self.assertEqual(levels, {lv: Course.objects.filter(platform=platform, level=lv).count() for lv in levels})
+        # Facets without a filter of their own count the hits of every filter
+        ratings = sum(count for _, _, count in response.context['ratings'])
+        self.assertEqual(ratings, Course.objects.filter(platform=platform, level='Advanced').count())
+
+    def test_search_with_database_ordering(self):
+        response = self.client.get(reverse('all_courses'), {'q': 'python', 'order': '-rating'})
+        self.assertWithinBudget('all_courses', response)
+
+
+class SearchResultCacheTests(QueryBudgetTestCase):
+
+    def search(self, **params):
+        response = self.client.get(reverse('all_courses'), params)
+        self.assertWithinBudget('all_courses', response)
+        return response
+
+    def course_ids(self, response):
+        return [c.id for c in response.context['courses']]
+
+    def test_repeated_search_is_cached(self):
+        first = self.search(q='Python  course', page=2)
+        hits = SEARCH_RESULTS.hits
+        # Same normalized query, another page
+        cached = self.search(q='python course', page=2)
+        self.assertEqual(SEARCH_RESULTS.hits, hits + 1)
+        self.assertEqual(cached['X-Whoosh-Searches'], '0')
+        self.assertEqual(self.course_ids(cached), self.course_ids(first))
+        self.assertEqual(cached.context['paginator'].count, self.n_courses)
+
+    def test_database_ordering_is_cached(self):
+        first = self.search(q='python', order='-rating', page=2)
+        cached = self.search(q='python', order='-rating', page=2)
+        self.assertEqual(cached['X-Whoosh-Searches'], '0')
+        self.assertEqual(self.course_ids(cached), self.course_ids(first))
+
+    def test_database_ordering_keeps_the_best_hits(self):
+        with mock.patch('main.views.MAX_CACHED_HITS', 12):
+            response = self.search(q='course 3 python', order='-rating')
+        best = {hit.url for hit in search_backend().search('course 3 python', limit=12)[0]}
+        courses = list(response.context['courses'])
+        self.assertEqual(response.context['paginator'].count, 12)
+        self.assertTrue({c.url for c in courses} <= best)
+        self.assertEqual([c.rating for c in courses], sorted((c.rating for c in courses), reverse=True))
+
+    def test_pages_past_the_cached_ranking(self):
+        with mock.patch('main.views.MAX_CACHED_HITS', 10):
+            first = self.search(q='python')
+            deeper = self.search(q='python', page=3)
+        ids = set(self.course_ids(first)) | set(self.course_ids(deeper))
+        self.assertEqual(len(ids), 20)
+
+    def test_invalidated_by_index_commit(self):
+        self.search(q='python')
+        invalidations = SEARCH_RESULTS.invalidations
+        index_courses([], init_whoosh())
+        response = self.search(q='python')
+        self.assertNotEqual(response['X-Whoosh-Searches'], '0')
+        self.assertEqual(SEARCH_RESULTS.invalidations, invalidations + 1)
+
+    def test_invalidated_by_catalog_changes(self):
+        self.search(q='python', order='title')
+        save_courses_dB([])
+        response = self.search(q='python', order='title')
+        self.assertNotEqual(response['X-Whoosh-Searches'], '0')
+
+    def test_invalidated_by_another_worker(self):
+        self.search(q='python', order='title')
+        # Versions live in the database, so a catalog saved by another process is seen here
+        SearchVersion.objects.update_or_create(name='catalog', defaults={'value': 1000})
+        response = self.search(q='python', order='title')
+        self.assertNotEqual(response['X-Whoosh-Searches'], '0')
+
+    def test_evictions(self):
+        evictions = SEARCH_RESULTS.evictions
+        with self.settings(SEARCH_CACHE_SIZE=2):
+            for q in ('python', 'course', 'programming'):
+                self.search(q=q)
+        self.assertEqual(SEARCH_RESULTS.stats()['entries'], 2)
+        self.assertEqual(SEARCH_RESULTS.evictions, evictions + 1)
+
+
+class StoredResultsTests(AllCoursesBudgetTests):
+    """The catalog tests again, with search result pages rendered from the fields stored in the index."""
+    stored_results = True
+
+    def test_search_without_loading_courses(self):
+        response = self.client.get(reverse('all_courses'), {'q': 'python', 'page': 2})
+        self.assertWithinBudget('all_courses', response)
+        self.assertFalse([sql for sql in response.wsgi_request.metrics.queries if '"main_course"' in sql])
+
+        shown = response.context['courses'].object_list
+        courses = Course.objects.select_related('platform', 'instructor').in_bulk([c.id for c in shown])
+        self.assertEqual(len(shown), 10)
+        for c in shown:
+            course = courses[c.id]
+            self.assertEqual(
+                (c.url, c.title, str(c.platform), c.level, str(c.instructor), c.duration, c.rating, c.description),
+                # Like save_courses_dB, the index keeps no zero durations
+                (course.url, course.title, str(course.platform), course.level, str(course.instructor),
+                 course.duration or None, course.rating, course.description),
+            )
+
+
+class CourseDetailBudgetTests(QueryBudgetTestCase):
+
+    def test_course_detail(self):
+        course = Course.objects.get(url="https://example.com/0")
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('course_detail', args=[course.id]))
+        self.assertWithinBudget('course_detail', response)
+        self.assertTrue(response.context['similar_courses'])
+
+
+class HomeBudgetTests(QueryBudgetMixin, TransactionTestCase):
+    """
+    The recommender branches run in threads of their own (RECOMMENDER_LATENCY_BUDGET), with connections
+    that only see committed data, so the catalog is committed instead of living in a test transaction.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.create_catalog()
+        # Someone who rated some courses like the user, and liked others the user never saw
+        classmate = User.objects.create_user("classmate")
+        for uc in UserCourse.objects.filter(user=self.user)[:4]:
+            UserCourse.objects.create(user=classmate, course=uc.course, liked=uc.liked, viewed=1)
+        self.unseen = list(Course.objects.exclude(usercourse__user=self.user)[:4])
+        for course in self.unseen:
+            UserCourse.objects.create(user=classmate, course=course, liked=True, viewed=1)
+        # Live recommendations are served from the precomputed data
+        with contextlib.redirect_stdout(io.StringIO()):
+            precalculate_data(workers=1)
+
+    def test_home_anonymous(self):
+        self.assertWithinBudget('home', self.client.get(reverse('home')))
+
+    def test_home_with_recommendations(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('home'))
+        self.assertWithinBudget('home', response)
+        self.assertEqual(len(response.context['recommended_courses']), 6)
+
+    def test_batch_recommendations_survive_feedback(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_batch_recommendations(workers=1)
+        stored = [r['course'].id for r in stored_recommendations(self.user, limit=6)]
+        self.assertTrue(stored)
+
+        self.client.force_login(self.user)
+        self.client.post(reverse('mark_course_viewed', args=[stored[0]]))
+        remaining = [r['course'].id for r in stored_recommendations(self.user, limit=6)]
+        self.assertNotIn(stored[0], remaining)
+        self.assertEqual(remaining[:len(stored) - 1], stored[1:])
+
+    def test_branch_queries_are_counted(self):
+        # Warm up the process-wide stores so both runs make the same queries
+        recommend_hybrid_report(self.user, limit=6)
+        with track() as sequential:
+            recommend_hybrid_report(self.user, limit=6)
+        with track() as concurrent:
+            _, completed = recommend_hybrid_report(self.user, limit=6, budget=settings.RECOMMENDER_LATENCY_BUDGET)
+        self.assertEqual(set(completed), {'content', 'collaborative'})
+        self.assertEqual(concurrent.sql, sequential.sql)
+
+    def test_collaborative_uses_current_ratings(self):
+        # Users are folded in from their ratings, so a user created after training with the same
+        # interactions gets the same recommendations, and new feedback changes them without retraining
+        twin = User.objects.create_user("twin")
+        for uc in UserCourse.objects.filter(user=self.user):
+            UserCourse.objects.create(user=twin, course=uc.course, liked=uc.liked, viewed=uc.viewed)
+        ranking = [(r['course'].id, r['score']) for r in recommend_collaborative(self.user, limit=5)]
+        self.assertEqual([(r['course'].id, r['score']) for r in recommend_collaborative(twin, limit=5)], ranking)
+
+        UserCourse.objects.create(user=self.user, course_id=ranking[0][0], liked=True, viewed=1)
+        self.assertNotIn(ranking[0][0], [r['course'].id for r in recommend_collaborative(self.user, limit=5)])
+
+    @override_settings(RECOMMENDER_HYBRID_BRANCHES=('content', 'item_based'))
+    def test_item_based_branch(self):
+        # The item similarities are only precomputed while a branch reads them
+        self.assertEqual(STORE.get('item_sim'), {})
+        with contextlib.redirect_stdout(io.StringIO()):
+            precalculate_data(workers=1)
+        self.assertTrue(STORE.get('item_sim'))
+        results, completed = recommend_hybrid_report(self.user, limit=6, budget=settings.RECOMMENDER_LATENCY_BUDGET)
+        self.assertEqual(set(completed), {'content', 'item_based'})
+        self.assertEqual(len(results), 6)
+        self.assertEqual(
+            {r['course'].id for r in recommend_item_based(self.user, limit=6)}, {c.id for c in self.unseen},
+        )
+
+    @override_settings(RECOMMENDER_HYBRID_BRANCHES=('content', 'user_based'))
+    def test_user_based_branch(self):
+        results, completed = recommend_hybrid_report(self.user, limit=6, budget=settings.RECOMMENDER_LATENCY_BUDGET)
+        self.assertEqual(set(completed), {'content', 'user_based'})
+        self.assertEqual(len(results), 6)
+        self.assertEqual(
+            {r['course'].id for r in recommend_user_based(self.user, limit=6)}, {c.id for c in self.unseen},
+        )
+
+
+class RecommendationCacheTests(QueryBudgetTestCase):
+    """Cached recommendation lists are keyed by the feedback generation stored in the database."""
+
+    def cached(self):
+        with mock.patch('main.recommender_cache.recommend_hybrid_report', return_value=([], ('popularity',))) as report:
+            cached_recommend_hybrid(self.user, limit=5)
+        return report.call_count
+
+    def test_invalidation_changes_the_key(self):
+        self.assertEqual(self.cached(), 1)
+        self.assertEqual(self.cached(), 0)
+        invalidate_user_recommendations(self.user.id)
+        self.assertEqual(self.cached(), 1)
+        self.assertEqual(self.cached(), 0)
+
+    def test_invalidated_by_another_worker(self):
+        stored_user_profile(self.user.id)
+        self.assertEqual(self.cached(), 1)
+        # Feedback handled by another process only changes the database
+        UserProfile.objects.filter(user=self.user).update(recommendations_generation=F('recommendations_generation') + 1)
+        self.assertEqual(self.cached(), 1)
+
+    def test_profile_rebuild_keeps_the_generation(self):
+        invalidate_user_recommendations(self.user.id)
+        generation = user_generation(self.user.id)
+        self.assertGreater(generation, 0)
+        rebuild_user_profile(self.user.id)
+        self.assertEqual(user_generation(self.user.id), generation)
+
+
+class BranchDeadlineTests(QueryBudgetTestCase):
+    """Branches missing the latency budget are left out of the hybrid, and the queued ones never run."""
+
+    @override_settings(RECOMMENDER_HYBRID_BRANCHES=('content', 'item_based', 'user_based', 'collaborative'))
+    def test_late_branches_are_cancelled(self):
+        courses = list(Course.objects.exclude(usercourse__user=self.user).order_by('id')[:4])
+        release = threading.Event()
+        queued_calls = []
+
+        def content(user, limit):
+            return [{'course': c, 'score': float(i)} for i, c in enumerate(courses)]
+
+        def slow(user, limit):
+            release.wait(5)
+            return []
+
+        def queued(user, limit):
+            queued_calls.append(user)
+            return []
+
+        # Two threads: content and a slow branch start, the other slow branch takes the thread content frees
+        executor = ThreadPoolExecutor(max_workers=2)
+        branches = {'content': content, 'item_based': slow, 'user_based': slow, 'collaborative': queued}
+        try:
+            with mock.patch.dict('main.recommender.HYBRID_BRANCHES', branches), \
+                    mock.patch('main.recommender._branch_executor', executor):
+                results, completed = recommend_hybrid_report(self.user, limit=4, budget=0.5)
+        finally:
+            release.set()
+            executor.shutdown(wait=True)
+
+        self.assertEqual(completed, ('content',))
+        # The weight of the hybrid is given to content alone
+        self.assertEqual([(r['course'], r['score']) for r in results], [(c, i / 3) for i, c in reversed(list(enumerate(courses)))])
+        self.assertEqual(queued_calls, [])
+
+
+class IncrementalRecommenderTests(QueryBudgetTestCase):
+    """The vectorized and incremental computations of the recommender match the ones they replace."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        courses = list(Course.objects.order_by('id'))
+        for u in range(6):
+            user = User.objects.create_user(f"learner{u}")
+            for i, course in enumerate(courses[u:u + 10]):
+                UserCourse.objects.create(user=user, course=course, liked=(i + u) % 3 == 0, disliked=(i + u) % 5 == 0, viewed=i % 3)
+        with contextlib.redirect_stdout(io.StringIO()), override_settings(RECOMMENDER_HYBRID_BRANCHES=('content', 'item_based')):
+            precalculate_data(workers=1)
+
+    @override_settings(RECOMMENDER_HYBRID_BRANCHES=('content', 'item_based'), RECOMMENDER_ITEM_SIM_DELAY=None)
+    def test_feedback_matches_full_recompute(self):
+        course = Course.objects.exclude(usercourse__user=self.user).order_by('id').first()
+        self.client.force_login(self.user)
+        self.client.post(reverse('mark_course_viewed', args=[course.id]))
+
+        # The shelve is not rewritten, the touched lists are stored for the current snapshot
+        self.assertEqual(STORE.get('item_sim'), self.item_sim_before)
+        full = compute_similar_items(build_prefs())
+        rated = list(UserCourse.objects.filter(user=self.user).values_list('course_id', flat=True))
+        self.assertIn(course.id, rated)
+        neighbours = item_neighbours(rated)
+        for cid in rated:
+            self.assertEqual([(round(s, 9), c) for s, c in neighbours[cid]], [(round(s, 9), c) for s, c in full.get(cid, [])])
+
+    def setUp(self):
+        super().setUp()
+        self.item_sim_before = STORE.get('item_sim')
+
+    def test_sparse_matches_calculate_similar_items(self):
+        prefs = build_prefs()
+        n = Course.objects.count()
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = calculateSimilarItems(prefs, n=n)
+        sparse = calculate_similar_items_sparse(prefs, n=n, block_size=7)
+        # topMatches pads the lists with the courses sharing no rater, which the sparse version leaves out
+        for course_id, scores in expected.items():
+            self.assertEqual(
+                {c: round(s, 9) for s, c in sparse.get(course_id, [])},
+                {c: round(s, 9) for s, c in scores if s > 0},
+            )
+
+    def test_profile_updates_match_rebuild(self):
+        courses = list(Course.objects.order_by('id'))
+        self.client.force_login(self.user)
+        stored_user_profile(self.user.id)
+        for course in courses[2:12:3]:
+            self.client.post(reverse('mark_course_viewed', args=[course.id]))
+        self.client.post(reverse('toggle_feedback', args=[courses[5].id, 'dislike']))
+        self.client.post(reverse('toggle_feedback', args=[courses[0].id, 'like']))
+        self.client.post(reverse('toggle_feedback', args=[courses[11].id, 'like']))
+        self.client.post(reverse('toggle_feedback', args=[courses[11].id, 'like']))
+
+        updated = UserProfile.objects.get(user=self.user)
+        rebuilt = rebuild_user_profile(self.user.id)
+        self.assertEqual(updated.weights, rebuilt.weights)
+        # Both vectors are decayed to different instants, which scales every feature alike
+        updated_vector, rebuilt_vector = normalize_profile(updated.vector), normalize_profile(rebuilt.vector)
+        self.assertEqual(set(updated_vector), set(rebuilt_vector))
+        for feat, value in rebuilt_vector.items():
+            self.assertAlmostEqual(updated_vector[feat], value, places=9)
+
+
+class AutocompleteTests(QueryBudgetTestCase):
+
+    def suggest(self, q, **params):
+        response = self.client.get(reverse('course_autocomplete'), {'q': q, **params})
+        self.assertWithinBudget('course_autocomplete', response)
+        return response.json()
+
+    def test_titles_and_keywords(self):
+        data = self.suggest('PYTH', limit=5)
+        self.assertEqual(data['keywords'], ['python'])
+        self.assertEqual(len(data['courses']), 5)
+        self.assertTrue(all(c['title'].startswith('Python course') for c in data['courses']))
+
+    def test_prefix_of_a_later_word(self):
+        data = self.suggest('cours')
+        self.assertEqual(len(data['courses']), 8)
+        self.assertEqual(data['keywords'], [])
+
+    def test_keywords_ranked_by_courses(self):
+        self.assertEqual(self.suggest('topic')['keywords'], ['topic0', 'topic1', 'topic2', 'topic3'])
+
+    def test_rebuilt_after_index_commit(self):
+        self.suggest('python')
+        builds = AUTOCOMPLETE.builds
+        index_courses([{
+            "url": "https://example.com/rust", "title": "Rust course", "description": "", "platform": "edX",
+            "level": "", "category": "", "instructor": "", "duration": None, "rating": None,
+            "last_scraped": timezone.now(), "keywords": ["rust"],
+        }], init_whoosh())
+        self.assertEqual(self.suggest('ru')['keywords'], ['rust'])
+        self.assertEqual(AUTOCOMPLETE.builds, builds + 1)
+
+    def test_served_from_memory(self):
+        self.suggest('python')
+        response = self.client.get(reverse('course_autocomplete'), {'q': 'python'})
+        self.assertEqual(response['X-SQL-Queries'], '0')
+
+
+class SearchBackendTests(QueryBudgetTestCase):
+    """The SQLite FTS5 backend answers like the Whoosh one."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        search_backend('sqlite_fts5').index_courses(cls.docs)
+
+    def setUp(self):
+        super().setUp()
+        self.backends = [search_backend('whoosh'), search_backend('sqlite_fts5')]
+
+    def test_search_with_filters(self):
+        filters = [FieldTerm('platform', 'edX'), FieldRange('rating', 4.0, 5.0, low_inclusive=False)]
+        expected = set(Course.objects.filter(platform__name='edX', rating__gt=4.0).values_list('url', flat=True))
+        for backend in self.backends:
+            hits, total = backend.search('python programming', filters, limit=100)
+            self.assertEqual({hit.url for hit in hits}, expected, backend.name)
+            self.assertEqual(total, len(expected), backend.name)
+
+    def test_search_ranks_title_matches_first(self):
+        for backend in self.backends:
+            hits, total = backend.search('course 17 unknownword', limit=5)
+            self.assertEqual(total, self.n_courses, backend.name)
+            self.assertEqual(hits[0].url, "https://example.com/17", backend.name)
+
+    def test_search_pages(self):
+        for backend in self.backends:
+            everything, total = backend.search('python', limit=None)
+            self.assertEqual(total, self.n_courses, backend.name)
+            pages = [backend.search('python', limit=10, offset=offset) for offset in (0, 10, 20, 30)]
+            self.assertEqual([hit.url for hits, _ in pages for hit in hits], [hit.url for hit in everything], backend.name)
+            self.assertEqual([total for _, total in pages], [self.n_courses] * 4, backend.name)
+
+    def test_lookup(self):
+        for backend in self.backends:
+            self.assertEqual(backend.lookup("https://example.com/5").keywords, ["python", "topic1"], backend.name)
+            self.assertIsNone(backend.lookup("https://example.com/missing"), backend.name)
+
+    def test_match_any(self):
+        clauses = [FieldTerm('keywords', 'topic2', boost=5.0), FieldTerm('level', 'Advanced', boost=2.0)]
+        for backend in self.backends:
+            hits = backend.match_any(clauses, limit=20)
+            # Courses 2, 14 and 26 have both
+            self.assertEqual({hit.url for hit in hits[:3]}, {f"https://example.com/{i}" for i in (2, 14, 26)}, backend.name)
+
+    def test_match_any_names(self):
+        expected = {f"https://example.com/{i}" for i in range(0, self.n_courses, 2)}
+        for backend in self.backends:
+            hits = backend.match_any([FieldTerm('instructor', 'Ana López', boost=2.0)], limit=self.n_courses)
+            self.assertEqual({hit.url for hit in hits}, expected, backend.name)
+
+    def test_search_ignores_name_columns(self):
+        for backend in self.backends:
+            self.assertEqual(backend.search('edx smith')[1], 0, backend.name)
+
+    def test_views_with_fts5(self):
+        with self.settings(SEARCH_BACKEND='sqlite_fts5'):
+            response = self.client.get(reverse('all_courses'), {'q': 'python', 'platform': Platform.objects.get(name='edX').id})
+            self.assertWithinBudget('all_courses', response)
+            self.assertEqual(response.context['paginator'].count, self.n_courses // 2)
+            self.assertTrue(all(str(c.platform) == 'edX' for c in response.context['courses']))
+
+            course = Course.objects.get(url="https://example.com/0")
+            response = self.client.get(reverse('course_detail', args=[course.id]))
+            self.assertWithinBudget('course_detail', response)
+            self.assertTrue(response.context['similar_courses'])
+
+
+    def test_index_search_backend_command(self):
+        backend = search_backend('sqlite_fts5')
+        backend.clear()
+        self.assertEqual(backend.search('python')[1], 0)
+        call_command('index_search_backend', backend='sqlite_fts5', stdout=io.StringIO())
+        self.assertEqual(backend.search('python')[1], self.n_courses)
+        url = "https://example.com/17"
+        self.assertEqual(backend.lookup(url), search_backend('whoosh').lookup(url))
+
+    def test_fts5_pages_past_the_cached_ranking(self):
+        # Filters are applied by the backend, and pages past the cached hits are searched from their offset
+        filters = {'q': 'python', 'level': 'Advanced', 'duration': '<5'}
+        expected = Course.objects.filter(level='Advanced', duration__lt=5, duration__gt=0).count()
+        with self.settings(SEARCH_BACKEND='sqlite_fts5'), mock.patch('main.views.MAX_CACHED_HITS', 1):
+            response = self.client.get(reverse('all_courses'), filters)
+            self.assertWithinBudget('all_courses', response)
+            self.assertEqual(response.context['paginator'].count, expected)
+            self.assertEqual(len(response.context['courses'].object_list), expected)
+
+
+class PrecomputedStoreTests(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+
+    def test_reloaded_only_for_a_new_version(self):
+        writer, reader = PrecomputedStore(f"{self.tmp}/store"), PrecomputedStore(f"{self.tmp}/store")
+        writer.update({'version': 1.0, 'item_sim': {}})
+        self.assertEqual(reader.get('version'), 1.0)
+
+        writer.update({'item_sim': {1: [(0.5, 2)]}})
+        self.assertEqual(writer.get('item_sim'), {1: [(0.5, 2)]})
+        self.assertEqual(reader.get('item_sim'), {})
+        self.assertEqual(reader.loads, 1)
+
+        writer.update({'version': 2.0})
+        self.assertEqual(reader.get('item_sim'), {1: [(0.5, 2)]})
+        self.assertEqual(reader.loads, 2)
+
+
+class TrackTests(TestCase):
+
+    def test_track_counts_queries(self):
+        with track() as metrics:
+            list(Course.objects.all())
+            Course.objects.count()
+        self.assertEqual(metrics.sql, 2)
+        self.assertEqual(metrics.whoosh, 0)
@@ -3,28 +3,34 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import login
 from .forms import SignUpForm
-from .models import Course, Category, Platform, Instructor, UserCourse
-from django.db.models import Count, Avg, Q, Case, When
+from .models import Course, Category, Platform, Instructor, UserCourse, RecommendationRun
+from django.db.models import Count, Avg, Q
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from .populateDB import populate_database
-from .populateDB import open_whoosh
-from whoosh.qparser import MultifieldParser
-from whoosh.qparser import OrGroup
-from .recommender import recommend_hybrid, recommend_for_anonymous
-from .recommender_utils import precalculate_data
-from whoosh.query import Term, And, NumericRange, Or, DateRange
+from .recommender_cache import cached_recommend_hybrid, cached_recommend_for_anonymous
+from .recommender_utils import precalculate_data, feedback_changed
+from .recommender import refresh_popularity
+from .recommender_batch import stored_recommendations
+from .recommender_store import STORE
+from .search import catalog_filters, catalog_facets, disjunctive_facet_counts, course_search_query, index_version, SearchResults, RankedResults, SEARCHERS
+from .search_backends import search_backend, catalog_clauses, FieldTerm, FieldRange
+from .search_cache import SEARCH_RESULTS, MAX_CACHED_HITS, normalize_query
+from whoosh.query import Term, And, Or, DateRange
 from datetime import datetime, timedelta
 from django.http import JsonResponse
+from django.urls import reverse
+from .autocomplete import AUTOCOMPLETE
 
 
 # -- BASIC PAGES
 def home(request):
-    categories = Category.objects.all()
+    categories = Category.objects.annotate(course_count=Count('course'))
     recommended_courses = []
     if request.user.is_authenticated:
-        recommended_courses = recommend_hybrid(request.user, limit=6)
+        # Lists from the last batch run; users missing from it are computed live
+        recommended_courses = stored_recommendations(request.user, limit=6) or cached_recommend_hybrid(request.user, limit=6)
     else:
-        recommended_courses = recommend_for_anonymous(limit=6)
+        recommended_courses = cached_recommend_for_anonymous(limit=6)
     
     return render(request, 'main/home.html', {'categories': categories, 'recommended_courses': recommended_courses})
 
@@ -42,6 +48,7 @@ def populate_with_data(request):
             return render(request, 'main/populate.html')
 
         populate_database(selected_scrapers)
+        refresh_popularity()
         return render(request, 'main/populate_done.html', {'scrapers': selected_scrapers, 'total_courses': Course.objects.count()}  )
 
     return render(request, 'main/populate.html')
@@ -75,36 +82,198 @@ def all_courses(request):
     rating = request.GET.get('rating', '').strip()
     order = request.GET.get('order', '').strip()
     
-    # Whoosh search
-    used_whoosh = False
+    allowed_orders = {
+        'title', '-title', 'duration', '-duration', 'rating', '-rating',
+        'platform__name', '-platform__name', 'instructor__name', '-instructor__name'
+    }
+
+    platforms = list(Platform.objects.all())
+    categories = list(Category.objects.all())
+
+    # Relevance-ordered searches are filtered and paginated by the search backend, loading only the courses
+    # of the page. Whoosh also counts their hits per filter option in the same search.
+    courses_page, facet_counts = None, None
+    if query and order not in allowed_orders:
+        backend = search_backend()
+        if backend.name == 'whoosh':
+            courses_page, paginator, facet_counts = search_courses_page(
+                query, request.GET.get('page', 1), platform_id, category_id, level, instructor_id, duration, rating,
+                platforms, categories,
+            )
+        else:
+            clauses, expressible = catalog_clauses(platforms, categories, platform_id, category_id, level, instructor_id, duration, rating)
+            if expressible:
+                courses_page, paginator = backend_search_page(backend, query, request.GET.get('page', 1), clauses)
+
+    if courses_page is None:
+        courses_page, paginator = filter_courses_page(
+            request, base_qs, query, platform_id, category_id, level, instructor_id, duration, rating, order, allowed_orders,
+        )
+
+    # Attach user feedback flags if authenticated
+    if request.user.is_authenticated:
+        feedback = {
+            course_id: (liked, disliked)
+            for course_id, liked, disliked in UserCourse.objects
+            .filter(user=request.user, course__in=[c.id for c in courses_page.object_list])
+            .values_list('course_id', 'liked', 'disliked')
+        }
+        for c in courses_page.object_list:
+            liked, disliked = feedback.get(c.id, (False, False))
+            setattr(c, 'is_liked', liked)
+            setattr(c, 'is_disliked', disliked)
+    else:
+        for c in courses_page.object_list:
+            setattr(c, 'is_liked', False)
+            setattr(c, 'is_disliked', False)
+
+    def facet_count(facet, key):
+        """Hits of a filter option, shown as "Coursera (312)", or None outside Whoosh searches."""
+        if not facet_counts or facet not in facet_counts:
+            return None
+        return facet_counts[facet].get(key, 0)
+
+    for plat in platforms:
+        plat.facet_count = facet_count('platform', str(plat.id))
+    for cat in categories:
+        cat.facet_count = facet_count('category', str(cat.id))
+
+    context = {
+        'courses': courses_page,
+        'paginator': paginator,
+        'platforms': platforms,
+        'categories': categories,
+        'levels': [(lvl[0], facet_count('level', lvl[0].lower())) for lvl in Course.LEVEL_CHOICES],
+        'instructors': Instructor.objects.all(),
+        'orders': [
+            ('', 'Por defecto'), ('title', 'Título ↑'), ('-title', 'Título ↓'),
+            ('duration', 'Duración ↑'), ('-duration', 'Duración ↓'),
+            ('rating', 'Puntuación ↑'), ('-rating', 'Puntuación ↓'),
+            ('platform__name', 'Plataforma ↑'), ('-platform__name', 'Plataforma ↓'),
+            ('instructor__name', 'Instructor ↑'), ('-instructor__name', 'Instructor ↓')
+        ],
+        'durations': [(val, label, facet_count('duration', val)) for val, label in
+                      [('<5', '<5 h'), ('5-10', '5-10 h'), ('10-50', '10-50 h'), ('>50', '>50 h')]],
+        'ratings': [(val, label, facet_count('rating', val)) for val, label in
+                    [('<3', 'Menos de 3'), ('3-4', '3.0 - 3.9'), ('4-4.5', '4.0 - 4.4'), ('>4.5', '4.5 o más')]],
+        'selected_platform': platform_id,
+        'selected_category': category_id,
+        'selected_level': level,
+        'selected_instructor': instructor_id,
+        'selected_duration': duration,
+        'selected_rating': rating,
+        'selected_order': order,
+        'query': query,
+    }
+
+    return render(request, 'main/all_courses.html', context)
+
+
+def get_page(paginator, page):
+    try:
+        return paginator.page(page)
+    except (PageNotAnInteger, EmptyPage):
+        return paginator.page(1)
+
+
+def search_courses_page(query, page, platform_id, category_id, level, instructor_id, duration, rating, platforms, categories):
+    """
+    Page of courses matching query, with the catalog filters applied by Whoosh and ordered by relevance,
+    and the hits per filter option ({facet: {key: count}}), each facet counted without its own filter.
+    The ranking is cached for later pages and repeated searches until the index or the catalog change.
+    Returns (None, None, None) if the filters cannot be expressed in the index or the search fails.
+    """
+    try:
+        with SEARCHERS.searcher() as searcher:
+            schema = searcher.schema
+            filters, expressible = catalog_filters(schema, platform_id, category_id, level, instructor_id, duration, rating)
+            if not expressible:
+                return None, None, None
+            search_filter = And(list(filters.values())) if filters else None
+
+            version = index_version(searcher)
+            key = ('whoosh', normalize_query(query), platform_id, category_id, level, instructor_id, duration, rating)
+            ranking = SEARCH_RESULTS.get(version, key)
+            if ranking is None:
+                facets = catalog_facets(schema, platforms, categories)
+                results = SearchResults(
+                    searcher, course_search_query(schema, query), filter=search_filter, pagelen=MAX_CACHED_HITS,
+                    groupedby=facets,
+                )
+                ranking = results.ranking()
+                ranking['facets'] = disjunctive_facet_counts(searcher, results.query, filters, facets, ranking['facets'])
+                ranking = SEARCH_RESULTS.set(version, key, ranking)
+
+            def deeper_hits(start, stop):
+                return SearchResults(searcher, course_search_query(schema, query), filter=search_filter).hits(start, stop)
+
+            paginator = Paginator(RankedResults(ranking['hits'], ranking['total'], ranking['field_name'], more=deeper_hits), 10)
+            # The page is loaded here, while the searcher is open
+            return get_page(paginator, page), paginator, ranking['facets']
+    except Exception as e:
+        print(f"Whoosh search error: {e}")
+        return None, None, None
+
+
+def backend_search_page(backend, query, page, clauses):
+    """
+    Page of courses matching query and the filter clauses, searched by a backend other than Whoosh and
+    ordered by relevance. The first hits are cached for later pages and repeated searches until the index
+    or the catalog change; deeper pages are searched again from their offset.
+    Returns (None, None) if the search fails.
+    """
+    try:
+        version = backend.version()
+        key = (backend.name, normalize_query(query), tuple(clauses))
+        ranking = SEARCH_RESULTS.get(version, key)
+        if ranking is None:
+            hits, total = backend.search(query, clauses, limit=MAX_CACHED_HITS)
+            ranking = SEARCH_RESULTS.set(version, key, {'hits': [(hit.url, hit.score) for hit in hits], 'total': total})
+
+        def deeper_hits(start, stop):
+            hits, _ = backend.search(query, clauses, limit=stop - start, offset=start)
+            return [(hit.url, hit.score) for hit in hits]
+
+        paginator = Paginator(RankedResults(ranking['hits'], ranking['total'], 'url', more=deeper_hits), 10)
+        return get_page(paginator, page), paginator
+    except Exception as e:
+        print(f"Search error ({backend.name}): {e}")
+        return None, None
+
+
+def filter_courses_page(request, base_qs, query, platform_id, category_id, level, instructor_id, duration, rating, order, allowed_orders):
+    """
+    Page of courses with the filters and ordering applied in the database, among the MAX_CACHED_HITS best
+    hits of the search backend for queries. The ranked ids of searches are cached until the index or the
+    catalog change, and only the courses of the page are loaded.
+    """
+    # Full-text search
     urls_order = []
     score_map = {}
     qs = base_qs
+    version = None
+    key = ('database', normalize_query(query), platform_id, category_id, level, instructor_id, duration, rating,
+           order if order in allowed_orders else '')
 
     if query:
-        ix = open_whoosh()
-        if ix:
-            try:
-                with ix.searcher() as searcher:
-                    field_weights = {
-                        'title': 2.0,
-                        'keywords': 1.5,
-                        'description': 1.0,
-                    }
-                    parser = MultifieldParser(['title', 'description', 'keywords'], schema=ix.schema, group=OrGroup, fieldboosts=field_weights)
-                    qobj = parser.parse(query)
-                    hits = searcher.search(qobj, limit=100)
-                    urls_order = [hit['url'] for hit in hits]
-                    score_map = {hit['url']: hit.score for hit in hits}
-                    used_whoosh = True
-                    if urls_order:
-                        qs = qs.filter(url__in=urls_order)
-                    else:
-                        qs = Course.objects.none()
-            except Exception as e:
-                print(f"Whoosh search error: {e}")
-                qs = base_qs.filter(Q(title__icontains=query) | Q(description__icontains=query))
-        else:
+        backend = search_backend()
+        try:
+            version = backend.version()
+            ranking = SEARCH_RESULTS.get(version, key)
+            if ranking is not None:
+                paginator = Paginator(RankedResults(ranking['hits'], field_name='pk'), 10)
+                return get_page(paginator, request.GET.get('page', 1)), paginator
+
+            hits, _ = backend.search(query, limit=MAX_CACHED_HITS)
+            urls_order = [hit.url for hit in hits]
+            score_map = {hit.url: hit.score for hit in hits}
+            if urls_order:
+                qs = qs.filter(url__in=urls_order)
+            else:
+                qs = Course.objects.none()
+        except Exception as e:
+            print(f"Search error ({backend.name}): {e}")
+            version = None
             qs = base_qs.filter(Q(title__icontains=query) | Q(description__icontains=query))
 
     # Filters
@@ -142,70 +311,53 @@ def all_courses(request):
         qs = qs.filter(rating_map[rating])
 
     # Ordering
-    allowed_orders = {
-        'title', '-title', 'duration', '-duration', 'rating', '-rating',
-        'platform__name', '-platform__name', 'instructor__name', '-instructor__name'
-    }
     if order in allowed_orders:
         qs = qs.order_by(order)
-    elif query and used_whoosh and urls_order:
-        whens = [When(url=u, then=pos) for pos, u in enumerate(urls_order)]
-        qs = qs.annotate(search_order=Case(*whens)).order_by('search_order')
 
     # Pagination
-    paginator = Paginator(qs, 10)
+    if version is not None:
+        rows = qs.values_list('pk', 'url')
+        if order not in allowed_orders:
+            # Relevance order of the hits, sorted here rather than with one CASE branch per hit
+            positions = {url: pos for pos, url in enumerate(urls_order)}
+            rows = sorted(rows, key=lambda row: positions[row[1]])
+        hits = [(pk, score_map.get(url)) for pk, url in rows]
+        ranking = SEARCH_RESULTS.set(version, key, {'hits': hits})
+        paginator = Paginator(RankedResults(ranking['hits'], field_name='pk'), 10)
+    else:
+        paginator = Paginator(qs, 10)
     page = request.GET.get('page', 1)
-    try:
-        courses_page = paginator.page(page)
-    except (PageNotAnInteger, EmptyPage):
-        courses_page = paginator.page(1)
+    courses_page = get_page(paginator, page)
 
-    # Attach Whoosh score
+    # Attach search score
     for c in courses_page.object_list:
         setattr(c, 'search_score', score_map.get(c.url))
 
-    # Attach user feedback flags if authenticated
-    if request.user.is_authenticated:
-        for c in courses_page.object_list:
-            uc = UserCourse.objects.filter(user=request.user, course=c).first()
-            setattr(c, 'is_liked', bool(uc and uc.liked))
-            setattr(c, 'is_disliked', bool(uc and uc.disliked))
-    else:
-        for c in courses_page.object_list:
-            setattr(c, 'is_liked', False)
-            setattr(c, 'is_disliked', False)
+    return courses_page, paginator
 
-    context = {
-        'courses': courses_page,
-        'paginator': paginator,
-        'platforms': Platform.objects.all(),
-        'categories': Category.objects.all(),
-        'levels': [lvl[0] for lvl in Course.LEVEL_CHOICES],
-        'instructors': Instructor.objects.all(),
-        'orders': [
-            ('', 'Por defecto'), ('title', 'Título ↑'), ('-title', 'Título ↓'),
-            ('duration', 'Duración ↑'), ('-duration', 'Duración ↓'),
-            ('rating', 'Puntuación ↑'), ('-rating', 'Puntuación ↓'),
-            ('platform__name', 'Plataforma ↑'), ('-platform__name', 'Plataforma ↓'),
-            ('instructor__name', 'Instructor ↑'), ('-instructor__name', 'Instructor ↓')
-        ],
-        'ratings': [('', 'Puntuación'), ('<3', 'Menos de 3'), ('3-4', '3.0 - 3.9'),
-                    ('4-4.5', '4.0 - 4.4'), ('>4.5', '4.5 o más')],
-        'selected_platform': platform_id,
-        'selected_category': category_id,
-        'selected_level': level,
-        'selected_instructor': instructor_id,
-        'selected_duration': duration,
-        'selected_rating': rating,
-        'selected_order': order,
-        'query': query,
-    }
 
-    return render(request, 'main/all_courses.html', context)
+def course_autocomplete(request):
+    """Suggestions for the search box as the user types: course titles and keywords starting with q."""
+    query = request.GET.get('q', '').strip()
+    limit = request.GET.get('limit', '8')
+    limit = int(limit) if limit.isdigit() else 8
+
+    try:
+        suggestions = AUTOCOMPLETE.suggest(query, limit)
+    except Exception as e:
+        print(f"Autocomplete error: {e}")
+        suggestions = {'courses': [], 'keywords': []}
+
+    courses = [
+        {'title': c['title'], 'url': reverse('course_detail', args=[c['id']])}
+        for c in suggestions['courses']
+    ]
+    return JsonResponse({'query': query, 'courses': courses, 'keywords': suggestions['keywords']})
+
 
 def course_detail(request, course_id):
     try:
-        course = Course.objects.get(id=course_id)
+        course = Course.objects.select_related('platform', 'instructor', 'category').get(id=course_id)
     except Course.DoesNotExist:
         messages.error(request, 'El curso solicitado no existe.')
         return render(request, 'main/course_not_found.html')
@@ -231,117 +383,103 @@ def course_detail(request, course_id):
 
 # WHOOSH-BASED SIMILARITY AND RECOMMENDATIONS
 
+def hits_to_courses(urls):
+    """{url: course} for the urls of some Whoosh hits, in a single query."""
+    return Course.objects.select_related('platform', 'instructor', 'category').in_bulk([url for url in urls if url], field_name='url')
+
 # Note the minscore from Whoosh may eliminate results that are slightly similar as they are not deemed relevant enough.
 def similar_courses_given_course(course):
     """
-    Return a list of similar courses to the given course using Whoosh search.
+    Return a list of similar courses to the given course using the search backend.
     Get courses with similar level, category, instructor, platform, duration of +- 5 hours,
     similar keywords, rating of +- 0.5.
     """
-    ix = open_whoosh()
     similar_courses = Course.objects.none()
-    if ix:
-        try:
-            with ix.searcher() as searcher:
-                query_parts = []
-
-                # Duration ±5
-                if getattr(course, 'duration', None) is not None:
-                    dur = float(course.duration)
-                    query_parts.append(NumericRange('duration', dur - 5, dur + 5, boost=2.5))
-
-                # Rating ±0.5
-                if getattr(course, 'rating', None) is not None:
-                    r = float(course.rating)
-                    query_parts.append(NumericRange('rating', r - 0.5, r + 0.5, boost=1))
-
-                # Level
-                if getattr(course, 'level', None):
-                    query_parts.append(Term('level', course.level.lower(), boost=2.0))
-
-                # Instructor name
-                instr_name = None
-                if getattr(course, 'instructor', None):
-                    instr_name = getattr(course.instructor, 'name', None) or str(course.instructor)
-                if instr_name:
-                    query_parts.append(Term('instructor', instr_name.lower(), boost=2.0))
-
-                # Platform name
-                platform_name = None
-                if getattr(course, 'platform', None):
-                    platform_name = getattr(course.platform, 'name', None) or str(course.platform)
-                if platform_name:
-                    query_parts.append(Term('platform', platform_name.lower(), boost=1))
-
-                # Category name
-                cat_name = None
-                if getattr(course, 'category', None):
-                    cat_name = getattr(course.category, 'name', None) or str(course.category)
-                if cat_name:
-                    query_parts.append(Term('category', cat_name.lower(), boost=5.0))
-
-                # Keywords
-                keywords = []
-                base_query = Term('url', course.url)
-
-                course_results = searcher.search(base_query, limit=1)
-
-                if course_results:
-                    raw = course_results[0].get('keywords', '') or ''
-                    keywords = [kw.strip().lower() for kw in raw.split(',') if kw.strip()]
-                else:
-                    keywords = []
-
-                keyword_boost = 5.0
-                keyword_terms = [Term('keywords', kw, boost=keyword_boost) for kw in keywords]
-                
-                # Build final query
-                final_query = None
-                all_parts = []
-                if query_parts:
-                    all_parts.extend(query_parts)
-                if keyword_terms:
-                    all_parts.extend(keyword_terms)
-                if all_parts:
-                    final_query = Or(all_parts)
-
-                if final_query is None:
-                    similar_courses = Course.objects.none()
-                else:
-                    results = searcher.search(final_query, limit=4)
-
-                    similar_list = []
-                    seen = set()
-                    for hit in results:
-                        url = hit.get('url')
-                        if not url or url in seen:
-                            continue
-                        seen.add(url)
-                        c = Course.objects.filter(url=url).first()
-                        if not c:
-                            continue
-                        if c.id == course.id:
-                            continue
-
-                        setattr(c, 'match_reasons', generate_match_reasons_details(course, c))
-                        similar_list.append(c)
-
-                    # attach global rank (1 = best)
-                    for idx, c in enumerate(similar_list, start=1):
-                        try:
-                            setattr(c, 'rank', idx)
-                        except Exception:
-                            pass
-
-                    similar_courses = similar_list[:3]
-        except Exception as e:
-            print(f"Whoosh similar courses error: {e}")
-            similar_courses = Course.objects.none()
+    backend = search_backend()
+    try:
+        clauses = []
+
+        # Duration ±5
+        if getattr(course, 'duration', None) is not None:
+            dur = float(course.duration)
+            clauses.append(FieldRange('duration', dur - 5, dur + 5, boost=2.5))
+
+        # Rating ±0.5
+        if getattr(course, 'rating', None) is not None:
+            r = float(course.rating)
+            clauses.append(FieldRange('rating', r - 0.5, r + 0.5, boost=1))
+
+        # Level
+        if getattr(course, 'level', None):
+            clauses.append(FieldTerm('level', course.level, boost=2.0))
+
+        # Instructor name
+        instr_name = None
+        if getattr(course, 'instructor', None):
+            instr_name = getattr(course.instructor, 'name', None) or str(course.instructor)
+        if instr_name:
+            clauses.append(FieldTerm('instructor', instr_name, boost=2.0))
+
+        # Platform name
+        platform_name = None
+        if getattr(course, 'platform', None):
+            platform_name = getattr(course.platform, 'name', None) or str(course.platform)
+        if platform_name:
+            clauses.append(FieldTerm('platform', platform_name, boost=1))
+
+        # Category name
+        cat_name = None
+        if getattr(course, 'category', None):
+            cat_name = getattr(course.category, 'name', None) or str(course.category)
+        if cat_name:
+            clauses.append(FieldTerm('category', cat_name, boost=5.0))
+
+        # Keywords
+        indexed = backend.lookup(course.url)
+        keywords = indexed.keywords if indexed else []
+
+        keyword_boost = 5.0
+        clauses.extend(FieldTerm('keywords', kw, boost=keyword_boost) for kw in keywords)
+
+        if clauses:
+            hits = backend.match_any(clauses, limit=4)
+            courses = hits_to_courses([hit.url for hit in hits])
+
+            similar_list = []
+            seen = set()
+            for hit in hits:
+                url = hit.url
+                if not url or url in seen:
+                    continue
+                seen.add(url)
+                c = courses.get(url)
+                if not c:
+                    continue
+                if c.id == course.id:
+                    continue
+
+                setattr(c, 'match_reasons', generate_match_reasons_details(course, c, keywords, hit.keywords))
+                similar_list.append(c)
+
+            # attach global rank (1 = best)
+            for idx, c in enumerate(similar_list, start=1):
+                try:
+                    setattr(c, 'rank', idx)
+                except Exception:
+                    pass
+
+            similar_courses = similar_list[:3]
+    except Exception as e:
+        print(f"Similar courses error ({backend.name}): {e}")
+        similar_courses = Course.objects.none()
 
     return similar_courses
 
-def generate_match_reasons_details(base_course, candidate):
-    """Return textual reasons explaining similarity for course details."""
+def generate_match_reasons_details(base_course, candidate, base_keywords=None, candidate_keywords=None):
+    """
+    Return textual reasons explaining similarity for course details.
+    Keywords already read from the index can be given; otherwise they are looked up in Whoosh.
+    """
     
     reasons = []
     
@@ -369,20 +507,11 @@ def generate_match_reasons_details(base_course, candidate):
         if rating_diff <= 0.5:
             reasons.append('puntuación similar')
 
-    # Retreive keywords from Whoosh index
-    ix = open_whoosh()
-    with ix.searcher() as searcher:
-        base_query = Term('url', base_course.url)
-        candidate_query = Term('url', candidate.url)
-
-        base_results = searcher.search(base_query, limit=1)
-        candidate_results = searcher.search(candidate_query, limit=1)
-
-        if base_results and candidate_results:
-            raw_base = base_results[0].get('keywords', '') or ''
-            raw_cand = candidate_results[0].get('keywords', '') or ''
-            base_course.keywords = [kw.strip().lower() for kw in raw_base.split(',') if kw.strip()]
-            candidate.keywords = [kw.strip().lower() for kw in raw_cand.split(',') if kw.strip()]
+    if base_keywords is not None and candidate_keywords is not None:
+        base_course.keywords = base_keywords
+        candidate.keywords = candidate_keywords
+    else:
+        retrieve_match_keywords(base_course, candidate)
 
     if getattr(base_course, 'keywords', None) and getattr(candidate, 'keywords', None):
         base_keywords = set(kw.strip().lower() for kw in (base_course.keywords or '') if kw.strip())
@@ -394,16 +523,25 @@ def generate_match_reasons_details(base_course, candidate):
 
     return ', '.join(reasons) if reasons else ''
 
+def retrieve_match_keywords(base_course, candidate):
+    """Retreive keywords of both courses from the search backend"""
+    backend = search_backend()
+    base_hit = backend.lookup(base_course.url)
+    candidate_hit = backend.lookup(candidate.url)
+
+    if base_hit and candidate_hit:
+        base_course.keywords = base_hit.keywords
+        candidate.keywords = candidate_hit.keywords
+
 def next_steps_given_course(course):
     """ 
     Using Whoosh, obtain courses that share keywords and category but are of higher level.
     And that have been scrapped in the last 30 days.
     """
 
-    ix = open_whoosh()
     next_courses = Course.objects.none()
 
-    with ix.searcher() as searcher:
+    with SEARCHERS.searcher() as searcher:
         query_parts = []
 
         # Category name
@@ -455,15 +593,16 @@ def next_steps_given_course(course):
             next_courses = Course.objects.none()
         else:
             results = searcher.search(final_query, limit=3)
+            urls = [hit.get('url') for hit in results]
+            courses = hits_to_courses(urls)
 
             next_list = []
             seen = set()
-            for hit in results:
-                url_c = hit.get('url')
+            for url_c in urls:
                 if not url_c or url_c in seen:
                     continue
                 seen.add(url_c)
-                c = Course.objects.filter(url=url_c).first()
+                c = courses.get(url_c)
                 if not c:
                     continue
                 if c.id == course.id:
@@ -500,6 +639,9 @@ def admin_panel(request):
         'total_categories': total_categories,
         'total_users': total_users,
         'platform_stats': platform_stats,
+        'recommender_store': STORE.stats(),
+        'last_batch_run': RecommendationRun.objects.filter(finished_at__isnull=False).first(),
+        'search_cache': SEARCH_RESULTS.stats(),
     })
 
 
@@ -539,6 +681,7 @@ def toggle_feedback(request, course_id, action):
             uc.liked = False
 
     uc.save()
+    feedback_changed(request.user.id, uc.course_id)
 
     # If this is an AJAX request, return JSON so the client can update UI without full reload
     is_ajax = (
@@ -559,5 +702,6 @@ def mark_course_viewed(request, course_id):
     user_course, __ = UserCourse.objects.get_or_create(user=request.user, course=course)
     user_course.viewed = user_course.viewed + 1
     user_course.save()
+    feedback_changed(request.user.id, course.id)
     return redirect(request.META.get('HTTP_REFERER', '/'))
 
@@ -2,6 +2,9 @@ document.addEventListener('DOMContentLoaded', function () {
     var orderSelect = document.getElementById('order-select');
     if (orderSelect) orderSelect.addEventListener('change', function () { if (this.form) this.form.submit(); });
 
+    var searchInput = document.querySelector('input[data-autocomplete-url]');
+    if (searchInput) setupAutocomplete(searchInput);
+
     document.addEventListener('click', function (e) {
         var btn = e.target.closest && e.target.closest('.ajax-feedback-btn');
         if (!btn) return;
@@ -11,6 +14,33 @@ document.addEventListener('DOMContentLoaded', function () {
     });
 });
 
+function setupAutocomplete(input) {
+    var datalist = document.getElementById(input.getAttribute('list'));
+    var timer = null;
+    var controller = null;
+
+    input.addEventListener('input', function () {
+        clearTimeout(timer);
+        var q = input.value.trim();
+        if (!q) { datalist.innerHTML = ''; return; }
+        timer = setTimeout(function () {
+            if (controller) controller.abort();
+            controller = new AbortController();
+            fetch(input.dataset.autocompleteUrl + '?q=' + encodeURIComponent(q), { signal: controller.signal })
+                .then(function (resp) { return resp.json(); })
+                .then(function (data) {
+                    datalist.innerHTML = '';
+                    data.keywords.concat(data.courses.map(function (c) { return c.title; })).forEach(function (text) {
+                        var option = document.createElement('option');
+                        option.value = text;
+                        datalist.appendChild(option);
+                    });
+                })
+                .catch(function (err) { if (err.name !== 'AbortError') console.error('Autocomplete failed:', err); });
+        }, 100);
+    });
+}
+
 function sendFeedback(form, btn) {
     var button = btn || form.querySelector('.ajax-feedback-btn');
     if (button) button.disabled = true;